@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Worker-local cache of acquisition metadata docs keyed by acquisition ID.
+
+The cache lives in a SQLite file under the worker's shared cache directory
+so that every localizer job on the worker (and every process of a job) sees
+the same entries. Acquisition metadata is immutable once ingested, so entries
+are only dropped when they outlive the TTL or when the cache grows past its
+size limit, in which case the least recently used entries go first.
+"""
+import os, json, time, sqlite3, logging
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+ACQ_CACHE_FILE_NAME = "acq_cache.sqlite"
+ACQ_CACHE_TTL = int(os.environ.get("ACQ_CACHE_TTL", 30 * 86400))
+ACQ_CACHE_MAX_ENTRIES = int(os.environ.get("ACQ_CACHE_MAX_ENTRIES", 200000))
+SQLITE_TIMEOUT = 60
+SQLITE_MAX_VARS = 500
+
+
+def get_cache_dir():
+    """Return the directory shared by all localizer jobs on this worker."""
+
+    cache_dir = os.environ.get("ACQ_LOCALIZER_CACHE_DIR")
+    if not cache_dir:
+        # /data/work is mounted from the worker host, so it outlives job containers
+        if os.path.isdir("/data/work/cache"):
+            cache_dir = "/data/work/cache/acquisition_localizer"
+        else:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "acquisition_localizer")
+    if not os.path.isdir(cache_dir):
+        try: os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir): raise
+    return cache_dir
+
+
+def chunks(items, size):
+    """Yield successive lists of at most size items."""
+
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+class AcqCache(object):
+    """On-disk, process-safe acquisition metadata cache with TTL and LRU eviction."""
+
+    def __init__(self, path=None, ttl=ACQ_CACHE_TTL, max_entries=ACQ_CACHE_MAX_ENTRIES):
+        self.path = path or os.path.join(get_cache_dir(), ACQ_CACHE_FILE_NAME)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS acq_cache (
+                              acq_id TEXT PRIMARY KEY,
+                              doc TEXT NOT NULL,
+                              created REAL NOT NULL,
+                              accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS acq_cache_accessed ON acq_cache (accessed)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, acq_ids):
+        """Return dict of acquisition ID to cached doc for the IDs that are cached and fresh."""
+
+        found = {}
+        now = time.time()
+        min_created = now - self.ttl
+        try:
+            with self._connect() as conn:
+                for batch in chunks(set(acq_ids), SQLITE_MAX_VARS):
+                    rows = conn.execute("SELECT acq_id, doc FROM acq_cache WHERE created >= ? AND acq_id IN (%s)" %
+                                        ",".join("?" * len(batch)), [min_created] + batch).fetchall()
+                    for acq_id, doc in rows:
+                        found[acq_id] = json.loads(doc)
+                if found:
+                    conn.executemany("UPDATE acq_cache SET accessed = ? WHERE acq_id = ?",
+                                     [(now, acq_id) for acq_id in found])
+        except sqlite3.Error as e:
+            logger.warning("Failed to read acquisition cache %s : %s" % (self.path, str(e)))
+        return found
+
+    def get(self, acq_id):
+        return self.get_many([acq_id]).get(acq_id)
+
+    def put_many(self, docs):
+        """Store dict of acquisition ID to doc, then evict if over the size limit."""
+
+        if not docs: return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO acq_cache (acq_id, doc, created, accessed) VALUES (?, ?, ?, ?)",
+                                 [(acq_id, json.dumps(doc), now, now) for acq_id, doc in docs.items()])
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("Failed to update acquisition cache %s : %s" % (self.path, str(e)))
+
+    def put(self, acq_id, doc):
+        self.put_many({acq_id: doc})
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM acq_cache WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COUNT(*) FROM acq_cache").fetchone()[0]
+        if total > self.max_entries:
+            # trim an extra 10% so we don't evict on every put once full
+            excess = total - self.max_entries + self.max_entries // 10
+            conn.execute("""DELETE FROM acq_cache WHERE acq_id IN
+                              (SELECT acq_id FROM acq_cache ORDER BY accessed LIMIT ?)""", (excess,))
+            logger.info("Evicted %s least recently used entries from %s" % (excess, self.path))
+
+
+_acq_cache = None
+
+
+def get_acq_cache():
+    """Return the worker's acquisition cache, or None if it is disabled or unusable.
+       The cache must never fail a localizer job, so errors just disable it."""
+
+    global _acq_cache
+    if os.environ.get("ACQ_CACHE_DISABLE"): return None
+    if _acq_cache is None:
+        try: _acq_cache = AcqCache()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Acquisition cache unavailable, continuing without it : %s" % str(e))
+            _acq_cache = False
+    return _acq_cache or None
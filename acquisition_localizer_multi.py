@@ -5,21 +5,26 @@ from builtins import range
 from past.utils import old_div
 from builtins import object
 import os, sys, time, json, requests, logging
-import hashlib
+import calendar
 from datetime import datetime
 #from hysds_commons.job_utils import resolve_hysds_job
-from hysds.celery import app
 import localizer_util
-import uuid  # only need this import to simulate returned mozart job id
-from hysds.celery import app
-from hysds_commons.job_utils import submit_mozart_job
+import acq_cache
+import slc_snapshot
+import sling_lease
+import queue_routing
+import scheduling
+import ifg_pairs
+import sharding
+import product_list
+import slc_ledger
 import traceback
-import time, random
+import socket
+from collections import OrderedDict
+from enum import Enum
 
 import acquisition_localizer_single
 
-GRQ_URL = app.conf.GRQ_ES_URL
-
 
 # set logger
 log_format = "[%(asctime)s: %(levelname)s/%(name)s/%(funcName)s] %(message)s"
@@ -38,32 +43,165 @@ logger.addFilter(LogFilter())
 IFG_CFG_ID_TMPL = "ifg-cfg_R{}_M{:d}S{:d}_TN{:03d}_{:%Y%m%dT%H%M%S}-{:%Y%m%dT%H%M%S}-{}-{}"
 
 BASE_PATH = os.path.dirname(__file__)
-MOZART_URL = app.conf['MOZART_URL']
 MOZART_ES_ENDPOINT = "MOZART"
 GRQ_ES_ENDPOINT = "GRQ"
+# seconds between job status polls when waiting for sling jobs to complete
 sleep_seconds = 120
 slc_check_max_sec = 300
 sling_completion_max_sec = 14400
 MAX_TRY = 2
-
-class ACQ(object):
-    def __init__(self, acq_id, acq_data, localized=False, job_id=None, job_status = None):
-        self.acq_id=acq_id
-        self.acq_data = acq_data
+LOCALIZED_DATA_FILE = "localized_data.json"
+LOCALIZED_STREAM_FILE = "localized_data.ndjson"
+PLAN_FILE = "localization_plan.json"
+# concurrent ASF probes when planning
+PLAN_PROBE_THREADS = 64
+# planning estimates, overridable with the ctx "plan" settings
+PLAN_MIN_HISTORY = 10
+DEFAULT_SLC_BYTES = int(4.5 * 1024**3)
+ROUTE_MBYTES_PER_SEC = { "asf": 50., "scihub": 10. }
+SLING_OVERHEAD_SEC = 300
+# job id -> id of the original job it was deduped against; fixed once assigned
+canonical_job_ids = {}
+# identifies this localizer as the holder of sling leases
+LEASE_OWNER = "%s-%s" %(socket.gethostname(), os.getpid())
+# how long to wait for the holder of a fresh lease to record its sling job before slinging the SLC anyway
+LEASE_JOB_WAIT = 120
+LEASE_POLL_SEC = 10
+# SLCs claimed at a time; their jobs are resolved and submitted before the next ones are claimed
+LEASE_CLAIM_BATCH = 50
+# acquisition fields used by the localizer, only these are fetched from GRQ
+ACQ_FIELDS = [ "id", "dataset", "dataset_type", "starttime", "metadata.identifier", "metadata.download_url", "metadata.archive_filename" ]
+# job doc fields used to follow job status and dedups
+JOB_STATUS_FIELDS = [ "status", "dedup_job" ]
+# job doc fields used to time finished sling jobs
+JOB_END_FIELDS = [ "job.job_info.time_end" ]
+# lookups that come back empty are retried once, together, after this interval
+empty_result_retry_seconds = 5
+# force an index refresh before retrying empty lookups
+empty_result_refresh = False
+
+class JobStatus(Enum):
+    """Mozart job states the localizer tracks."""
+    QUEUED = "job-queued"
+    STARTED = "job-started"
+    COMPLETED = "job-completed"
+    FAILED = "job-failed"
+    DEDUPED = "job-deduped"
+    OFFLINE = "job-offline"
+    REVOKED = "job-revoked"
+    UNKNOWN = "job-unknown"
+
+    @classmethod
+    def from_str(cls, status):
+        try: return cls(status)
+        except ValueError: return cls.UNKNOWN
+
+
+class AcqRecord(object):
+    """
+    Localization state of one acquisition. Only the acquisition fields the
+    localizer needs are kept, so large campaigns can be tracked in one process.
+    """
+    __slots__ = ("acq_id", "identifier", "dataset", "dataset_type", "download_url", "archive_filename",
+                 "starttime", "localized", "job_id", "job_status", "queue", "url_type")
+
+    def __init__(self, acq_id, acq_data, localized=False, job_id=None, job_status=None):
+        self.acq_id = acq_id
+        self.identifier = acq_data["metadata"]["identifier"]
+        # shared by every acquisition, so keep one copy
+        self.dataset = sys.intern(acq_data["dataset"])
+        self.dataset_type = sys.intern(acq_data["dataset_type"])
+        self.download_url = acq_data["metadata"]["download_url"]
+        self.archive_filename = acq_data["metadata"]["archive_filename"]
+        self.starttime = acq_data.get("starttime")
         self.localized = localized
         self.job_id = job_id
         self.job_status = job_status
+        # route of the sling job, once submitted
+        self.queue = None
+        self.url_type = None
 
-def get_acq_object(acq_id, acq_data, localized=False, job_id=None, job_status = None):
-    return {
-        "acq_id": acq_id,
-        "acq_data" :acq_data,
-        "localized" : localized,
-        "job_id": job_id,
-        "job_status": job_status
+    def update_job(self, job_id, job_status):
+        """Record the (possibly deduped) job id and its status string from Mozart."""
+        self.job_id = job_id
+        self.job_status = JobStatus.from_str(job_status)
 
+    def __repr__(self):
+        return "AcqRecord(%s, %s, localized=%s, job_id=%s, job_status=%s)" %(self.acq_id, self.identifier,
+               self.localized, self.job_id, self.job_status.value if self.job_status else None)
 
-    }
+
+class AcqTracker(object):
+    """
+    Keeps the acquisitions of acq_info in per-state sets that are updated on
+    every transition, so completion checks and picking the jobs to poll don't
+    have to sweep all of acq_info.
+    """
+    PENDING = "pending"      # not localized, no sling job yet
+    SUBMITTED = "submitted"  # sling job queued
+    RUNNING = "running"      # sling job started
+    COMPLETED = "completed"  # sling job completed, SLC not confirmed yet
+    FAILED = "failed"        # sling job failed, revoked or offline
+    LOCALIZED = "localized"  # SLC exists
+    STATES = (PENDING, SUBMITTED, RUNNING, COMPLETED, FAILED, LOCALIZED)
+
+    def __init__(self, acq_info):
+        self.acq_info = acq_info
+        self.states = { state: set() for state in self.STATES }
+        self.state_of = {}
+        for acq in acq_info.values():
+            self.update(acq)
+
+    def add(self, acq_info):
+        """Track the records of acq_info too."""
+        for acq_id, acq in acq_info.items():
+            self.acq_info[acq_id] = acq
+            self.update(acq)
+
+    @classmethod
+    def get_state(cls, acq):
+        if acq.localized: return cls.LOCALIZED
+        if acq.job_id is None: return cls.PENDING
+        if acq.job_status == JobStatus.STARTED: return cls.RUNNING
+        if acq.job_status == JobStatus.COMPLETED: return cls.COMPLETED
+        if acq.job_status in (JobStatus.FAILED, JobStatus.REVOKED, JobStatus.OFFLINE): return cls.FAILED
+        return cls.SUBMITTED
+
+    def update(self, acq):
+        """Move acq to the set of its current state. Returns True if its state changed."""
+        state = self.get_state(acq)
+        old_state = self.state_of.get(acq.acq_id)
+        if state == old_state: return False
+        if old_state is not None:
+            self.states[old_state].discard(acq.acq_id)
+        self.states[state].add(acq.acq_id)
+        self.state_of[acq.acq_id] = state
+        return True
+
+    def set_job(self, acq, job_id, job_status):
+        acq.update_job(job_id, job_status)
+        return self.update(acq)
+
+    def set_localized(self, acq, localized):
+        acq.localized = localized
+        return self.update(acq)
+
+    def get(self, state):
+        """Return the records currently in state."""
+        return [ self.acq_info[acq_id] for acq_id in self.states[state] ]
+
+    def count(self, state):
+        return len(self.states[state])
+
+    def to_poll(self):
+        """Records whose sling job is still outstanding."""
+        return self.get(self.SUBMITTED) + self.get(self.RUNNING)
+
+    def all_jobs_done(self):
+        return self.count(self.PENDING) == 0 and self.count(self.SUBMITTED) == 0 and self.count(self.RUNNING) == 0
+
+    def summary(self):
+        return ", ".join("%s : %s" %(state, self.count(state)) for state in self.STATES)
 
 
 def query_es(endpoint, doc_id):
@@ -76,10 +214,10 @@ def query_es(endpoint, doc_id):
     """
     es_url, es_index = None, None
     if endpoint == GRQ_ES_ENDPOINT:
-        es_url = app.conf["GRQ_ES_URL"]
+        es_url = localizer_util.get_grq_url()
         es_index = "grq"
     if endpoint == MOZART_ES_ENDPOINT:
-        es_url = app.conf['JOBS_ES_URL']
+        es_url = localizer_util.get_conf('JOBS_ES_URL')
         es_index = "job_status-current"
 
     query = {
@@ -127,6 +265,14 @@ def query_es(endpoint, doc_id):
 
 
 
+def get_canonical_job_id(job_id):
+    """Follow memoized dedups of job_id to the job doing the work."""
+
+    while job_id in canonical_job_ids:
+        job_id = canonical_job_ids[job_id]
+    return job_id
+
+
 def get_job_status(job_id):
     """
     This function gets the staged products and context of previous PGE job
@@ -134,15 +280,12 @@ def get_job_status(job_id):
     :return: tuple(products_staged, prev_context, message)
     the message refects the
     """
-    endpoint = MOZART_ES_ENDPOINT
     return_job_id = None
     return_job_status = None
 
-    #check if Jobs ES has updated job status
-    if check_ES_status(job_id):
-        response = query_es(endpoint, job_id)
-
-    result = response["hits"]["hits"][0]
+    # known dedups are resolved without querying the deduped job again
+    job_id = get_canonical_job_id(job_id)
+    result = {"_source": get_job_doc(job_id)}
     message = None  #using this to store information regarding deduped jobs, used later to as error message unless it's value is "success"
 
     #print ("Job INFO retrieved from ES: %s"%json.dumps(result))
@@ -151,13 +294,13 @@ def get_job_status(job_id):
     if status == "job-deduped":
         #query ES for the original job's status
         orig_job_id = result["_source"]["dedup_job"]
+        canonical_job_ids[job_id] = orig_job_id
         return_job_id = orig_job_id
-        orig_job_info = query_es(endpoint, orig_job_id)
+        orig_job_info = {"_source": get_job_doc(orig_job_id)}
         """check if original job failed -> this would happen when at the moment of deduplication, the original job
          was in 'running state', but soon afterwards failed. So, by the time the status is checked in this function,
          it may be shown as failed."""
         #print ("Original JOB info: \n%s"%json.dumps(orig_job_info))
-        orig_job_info = orig_job_info["hits"]["hits"][0]
         orig_job_status = str(orig_job_info["_source"]["status"])
         logger.info("Check Job Status : Job %s was Deduped. The new/origianl job id is %s whose status is : %s" %(job_id, return_job_id, return_job_status)) 
         return_job_status = orig_job_status
@@ -177,6 +320,136 @@ def get_job_status(job_id):
 
     return return_job_status, return_job_id
 
+def get_job_docs(job_ids, fields=JOB_STATUS_FIELDS):
+    """
+    Get job docs from job_status-current with a realtime multi-get, which
+    sees newly indexed or updated docs before the index is refreshed.
+    :param job_ids: list of Job ES doc IDs
+    :param fields: job doc fields to fetch
+    :return: dict of job id to doc source for the jobs found; empty if the
+             multi-get could not be served (e.g. the alias spans several indices)
+    """
+    if len(job_ids) == 0: return {}
+    es_url = localizer_util.get_conf('JOBS_ES_URL')
+    es_index = "job_status-current"
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    mget_url = '%s/%s/_mget?_source=%s' % (rest_url, es_index, ",".join(fields))
+    query = { "ids": list(job_ids) }
+
+    try:
+        r = localizer_util.get_session().post(mget_url, data=json.dumps(query))
+    except requests.exceptions.RequestException as e:
+        logger.info("Realtime get of job status failed : %s" %str(e))
+        return {}
+    if r.status_code != 200:
+        logger.info("Realtime get of job status failed, status code %s : %s" %(r.status_code, r.text))
+        return {}
+
+    return { doc['_id']: doc['_source'] for doc in r.json()['docs'] if doc.get('found', False) }
+
+
+def search_job_docs(job_ids, fields=JOB_STATUS_FIELDS):
+    """
+    Get job docs from job_status-current with a single ids search, for the
+    jobs a realtime multi-get could not return. Unlike check_ES_status this
+    does not wait for missing jobs to show up.
+    :param job_ids: list of Job ES doc IDs
+    :param fields: job doc fields to fetch
+    :return: dict of job id to doc source for the jobs found
+    """
+    if len(job_ids) == 0: return {}
+    es_url = localizer_util.get_conf('JOBS_ES_URL')
+    es_index = "job_status-current"
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    search_url = '%s/%s/_search' % (rest_url, es_index)
+    query = {
+        "_source": fields,
+        "query": { "ids": { "values": list(job_ids) } },
+        "size": len(job_ids)
+    }
+
+    try:
+        r = localizer_util.get_session().post(search_url, data=json.dumps(query))
+    except requests.exceptions.RequestException as e:
+        logger.info("Search of job status failed : %s" %str(e))
+        return {}
+    if r.status_code != 200:
+        logger.info("Search of job status failed, status code %s : %s" %(r.status_code, r.text))
+        return {}
+
+    return { hit['_id']: hit['_source'] for hit in r.json()['hits']['hits'] }
+
+
+def fetch_job_docs(job_ids):
+    """Get job docs with batched realtime multi-gets, searching for the ones they miss."""
+
+    docs = {}
+    for i in range(0, len(job_ids), localizer_util.MGET_BATCH_SIZE):
+        docs.update(get_job_docs(job_ids[i:i+localizer_util.MGET_BATCH_SIZE]))
+    missing = [ job_id for job_id in job_ids if job_id not in docs ]
+    for i in range(0, len(missing), localizer_util.MGET_BATCH_SIZE):
+        docs.update(search_job_docs(missing[i:i+localizer_util.MGET_BATCH_SIZE]))
+    return docs
+
+
+def get_job_status_batch(job_ids):
+    """
+    Get the status of many jobs with batched lookups, following dedups to the
+    original job like get_job_status does. Jobs that are not found (e.g. not
+    indexed yet, or purged from Mozart) get the job-unknown status instead of
+    being waited for.
+    :param job_ids: list of Mozart job ids
+    :return: dict of job id to tuple(job_status, job_id of the job doing the work)
+    """
+    # known dedups are resolved without querying the deduped jobs again
+    query_ids = list(set(get_canonical_job_id(job_id) for job_id in job_ids))
+    docs = fetch_job_docs(query_ids)
+
+    # follow dedup chains a level at a time
+    while True:
+        for job_id, doc in list(docs.items()):
+            if doc["status"] == JobStatus.DEDUPED.value:
+                canonical_job_ids[job_id] = doc["dedup_job"]
+        orig_job_ids = list(set(doc["dedup_job"] for doc in docs.values()
+                                if doc["status"] == JobStatus.DEDUPED.value and doc["dedup_job"] not in docs))
+        if len(orig_job_ids) == 0: break
+        orig_docs = fetch_job_docs(orig_job_ids)
+        if len(orig_docs) == 0: break
+        docs.update(orig_docs)
+
+    statuses = {}
+    for job_id in job_ids:
+        work_job_id = get_canonical_job_id(job_id)
+        doc = docs.get(work_job_id)
+        if doc is None or doc["status"] == JobStatus.DEDUPED.value:
+            logger.info("Job %s not found in Mozart, status unknown" % work_job_id)
+            statuses[job_id] = (JobStatus.UNKNOWN.value, work_job_id)
+        else:
+            statuses[job_id] = (str(doc["status"]), work_job_id)
+    return statuses
+
+
+def lease_job_failed(lease):
+    """A sling lease can be taken over once the job it recorded has failed."""
+
+    if not lease.get('job_id'):
+        return False
+    job_status, job_id = get_job_status_batch([lease['job_id']])[lease['job_id']]
+    return JobStatus.from_str(job_status) in (JobStatus.FAILED, JobStatus.REVOKED, JobStatus.OFFLINE)
+
+
+def get_job_doc(job_id):
+    """
+    Get a job doc, falling back to searching with backoff when the realtime
+    get does not return it.
+    """
+    docs = get_job_docs([job_id])
+    if job_id in docs:
+        return docs[job_id]
+    if check_ES_status(job_id):
+        return query_es(MOZART_ES_ENDPOINT, job_id)["hits"]["hits"][0]["_source"]
+
+
 def check_ES_status(doc_id):
     """
     There is a latency in the update of ES job status after
@@ -187,7 +460,7 @@ def check_ES_status(doc_id):
     :return: True  if the ES has updated job status within 5 minutes
             otherwise raise a run time error
     """
-    es_url = app.conf['JOBS_ES_URL']
+    es_url = localizer_util.get_conf('JOBS_ES_URL')
     es_index = "job_status-current"
     query = {
         "_source": [
@@ -257,137 +530,179 @@ def check_ES_status(doc_id):
     return True
 
 
-def get_slc_dataset_with_opds(slc_id, index_suffix=None):
-    slc_id_pds = slc_id + "-pds"
-    if index_suffix:
-        result_orig = localizer_util.get_dataset(slc_id, index_suffix)
-        result_pds = localizer_util.get_dataset(slc_id_pds, index_suffix)
-    else:
-        result_orig = localizer_util.get_dataset(slc_id)
-        result_pds = localizer_util.get_dataset(slc_id_pds)
+def wait_before_retry(es_index, count):
+    """Wait empty_result_retry_seconds, optionally refreshing es_index first, before retrying empty lookups."""
 
-    result = result_orig if result_orig['hits']['total'] >  result_pds['hits']['total']  else result_pds
-    return result
+    logger.info("%s lookups on %s returned no hits, retrying them in %s secs" %(count, es_index, empty_result_retry_seconds))
+    if empty_result_refresh:
+        localizer_util.refresh_index(es_index)
+    time.sleep(empty_result_retry_seconds)
 
-def check_slc_status(slc_id, index_suffix):
 
-    result = get_slc_dataset_with_opds(slc_id, index_suffix)
-    total = result['hits']['total']
-    if total == 0:
-        time.sleep(random.randint(5, 21))
-        result = get_slc_dataset_with_opds(slc_id, index_suffix)
-        total = result['hits']['total']
-    if total > 0:
-        return True
+def retry_empty_results(missing, lookup, es_index):
+    """
+    Retry a batch of lookups that returned no hits, once and all together.
+    :param missing: list of IDs whose lookup returned no hits
+    :param lookup: function taking a list of IDs and returning a dict of the ones found
+    :param es_index: index pattern searched by lookup
+    :return: dict of the IDs found on retry
+    """
+    if len(missing) == 0:
+        return {}
+    wait_before_retry(es_index, len(missing))
+    return lookup(missing)
 
-    return False
 
-def check_slc_status(slc_id):
+def get_slc_status_batch(slc_ids, index_suffix=localizer_util.SLC_INDEX_SUFFIX, retry=False):
+    """
+    Return dict of SLC id to whether it (or its -pds variant) exists in the SLC index.
+    With retry, the SLCs not found are looked up once more after empty_result_retry_seconds;
+    for confirming SLCs whose sling job completed, which may not be searchable yet.
+    """
 
-    result = get_slc_dataset_with_opds(slc_id)
-    total = result['hits']['total']
-    if total == 0:
-        time.sleep(random.randint(5, 21))
-        result = get_slc_dataset_with_opds(slc_id)
-        total = result['hits']['total']
+    es_index = localizer_util.get_index(index_suffix)
 
-    if total > 0:
-        return True
+    def lookup(ids):
+        docs = localizer_util.mget_docs(ids + [i + "-pds" for i in ids], es_index, source=[])
+        return { i: True for i in ids if i in docs or i + "-pds" in docs }
 
-    return False
+    if len(slc_ids) == 0:
+        return {}
+    status = { slc_id: False for slc_id in slc_ids }
+    # most SLCs were localized long ago, so answer positives from the local snapshot
+    snapshot = slc_snapshot.get_slc_snapshot()
+    if snapshot is not None:
+        for slc_id in slc_ids:
+            if slc_id in snapshot or slc_id + "-pds" in snapshot:
+                status[slc_id] = True
 
-def get_acq_data(id):
-    es_url = GRQ_URL
-    es_index = "grq"
+    missing = [ slc_id for slc_id in status if not status[slc_id] ]
+    status.update(lookup(missing))
+    if retry:
+        missing = [ slc_id for slc_id in status if not status[slc_id] ]
+        status.update(retry_empty_results(missing, lookup, es_index))
+    return status
 
-    query = {
-        "query": {
-            "term": {
-                "_id": id,
-            },
-        },
-        "partial_fields" : {
-            "partial" : {
-                "exclude" : "city",
-            }
-        }
-    }
+def check_slc_status(slc_id, index_suffix=localizer_util.SLC_INDEX_SUFFIX):
 
-    print(query)
+    return get_slc_status_batch([slc_id], index_suffix)[slc_id]
 
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+def get_acq_data_batch(acq_ids):
+    """Return dict of acquisition id to acquisition doc for the ones found."""
 
-    if r.status_code != 200:
-        print("Failed to query %s:\n%s" % (es_url, r.text))
-        print("query: %s" % json.dumps(query, indent=2))
-        print("returned: %s" % r.text)
-        r.raise_for_status()
+    docs = localizer_util.mget_docs(acq_ids, localizer_util.ACQ_INDEX, source=ACQ_FIELDS)
+    return { acq_id: docs[acq_id]['_source'] for acq_id in docs }
 
-    result = r.json()
-    print(result['hits']['total'])
-    return result['hits']['total'], result['hits']['hits'][0]
 
+def get_acq_info(acq_docs):
+    """Build acq_info from acquisition docs, checking their SLCs' status in one batch."""
 
-def get_acq_data_from_list(acq_list):
-    logger.info("get_acq_data_from_list")
     acq_info = {}
-    # Find out status of all Master ACQs, create a ACQ object with that and update acq_info dictionary 
-    for acq in acq_list: 
-        #logger.info(acq) 
-        #acq_data = localizer_util.get_acquisition_data(acq)[0]['fields']['partial'][0]
-        total, acq_data_value =  get_acq_data(acq)
-        if total ==0:
-            time.sleep(random.randint(5, 21))
-            total, acq_data_value =  get_acq_data(acq)
-            if total ==0:
-                logger.info("Failed to get information about Acqusition(possibly missing??) : %s" %acq)
-                raise RuntimeError("Failed to get information about Acqusition(possibly missing??) : %s" %acq)
-        
-        acq_data = acq_data_value['fields']['partial'][0] 
-        status = check_slc_status(acq_data['metadata']['identifier']) 
-        if status: 
+    identifiers = [ acq_data['metadata']['identifier'] for acq_data in acq_docs.values() ]
+    # SLCs the ledger has seen localized need no existence check
+    ledger = slc_ledger.get_slc_ledger()
+    entries = ledger.get_many(identifiers) if ledger else {}
+    slc_status = { identifier: True for identifier in identifiers
+                   if entries.get(identifier, {}).get('state') == slc_ledger.LOCALIZED }
+    slc_status.update(get_slc_status_batch([ identifier for identifier in identifiers if identifier not in slc_status ]))
+    if ledger:
+        record_newly_localized(ledger, entries, [ (acq_data['metadata']['identifier'], acq) for acq, acq_data in acq_docs.items()
+                                                  if slc_status[acq_data['metadata']['identifier']] ])
+    for acq, acq_data in acq_docs.items():
+        if slc_status[acq_data['metadata']['identifier']]:
             # status=1 
             logger.info("%s exists" %acq_data['metadata']['identifier']) 
-            acq_info[acq]=get_acq_object(acq, acq_data, 1) 
+            acq_info[acq]=AcqRecord(acq, acq_data, True)
         else: 
             #status = 0 
             logger.info("%s does NOT exist"%acq_data['metadata']['identifier']) 
-            acq_info[acq]=get_acq_object(acq, acq_data, 0)
+            acq_info[acq]=AcqRecord(acq, acq_data, False)
     return acq_info
 
 
-def get_acq_data_from_query(query):
-    logger.info("get_acq_data_from_query")
-    acq_info = {}
+def get_acq_data_from_list(acq_list):
+    logger.info("get_acq_data_from_list")
+
+    # acquisition metadata is immutable once ingested, so check the worker's cache first
+    cache = acq_cache.get_acq_cache()
+    acq_docs = cache.get_many(acq_list) if cache else {}
+    logger.info("get_acq_data_from_list : %s of %s acquisitions found in cache" %(len(acq_docs), len(acq_list)))
+
+    missing = [ acq for acq in acq_list if acq not in acq_docs ]
+    new_acqs = get_acq_data_batch(missing)
+    missing = [ acq for acq in missing if acq not in new_acqs ]
+    new_acqs.update(retry_empty_results(missing, get_acq_data_batch, localizer_util.ACQ_INDEX))
+    missing = [ acq for acq in missing if acq not in new_acqs ]
+    if len(missing) > 0:
+        err_msg = "Failed to get information about Acqusition(possibly missing??) : %s" %", ".join(missing)
+        logger.info(err_msg)
+        raise RuntimeError(err_msg)
+
+    if cache:
+        cache.put_many(new_acqs)
+    acq_docs.update(new_acqs)
+
+    # Find out status of all Master ACQs, create a ACQ object with that and update acq_info dictionary 
+    return get_acq_info(OrderedDict((acq, acq_docs[acq]) for acq in acq_list))
+
+
+def iter_acq_info(acq_list, skip=()):
+    """Yield acq_info of acq_list batch by batch, leaving out duplicates and the ids in skip."""
+
+    for batch in product_list.batches(acq_list):
+        batch = [ acq_id for acq_id in OrderedDict.fromkeys(batch) if acq_id not in skip ]
+        if len(batch) > 0:
+            yield get_acq_data_from_list(batch)
+
+
+def get_acq_ids_from_query(query):
+    """
+    Return the ids of the acquisitions matching the ES query. Only the ids are scrolled,
+    so the scroll is over before the acquisitions are looked up and slung in batches,
+    which can take longer than the scroll keep-alive.
+    """
+    logger.info("get_acq_ids_from_query")
+
+    for attempt in range(2):
+        acq_list = list(OrderedDict.fromkeys(iter_query_ids(query)))
+        if len(acq_list) > 0:
+            logger.info("get_acq_ids_from_query : Found %s data" %len(acq_list))
+            return acq_list
+        if attempt == 0:
+            wait_before_retry(localizer_util.ACQ_INDEX, 1)
+    raise RuntimeError("No Acquisition Found that Matched the Criteria.")
+
+
+def iter_query_ids(query):
+    """Yield the ids of the acquisitions matching the ES query."""
+
+    es_index = localizer_util.resolve_index(localizer_util.ACQ_INDEX)
+    for hits in localizer_util.iter_scan_pages(dict(query, _source=False), es_index):
+        for hit in hits:
+            yield hit["_id"]
+
+def get_json_param(ctx, key):
+    """
+    Return the JSON object param key of the context, or None if it is unset. Params
+    submitted through hysds-io may arrive empty or as JSON text.
+    """
+    value = ctx.get(key)
+    if value is None or value == "":
+        return None
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def get_products(ctx, ctx_file):
+    """
+    Return the acquisition ids of the context: the "products" list, or a lazily read
+    iterator over the ids of the "products_file" product list file (see product_list).
+    """
+    if ctx.get('products_file'):
+        return product_list.iter_products(product_list.get_products_path(ctx['products_file'], ctx_file))
+    if not ctx.get('products'):
+        raise RuntimeError("No products, products_file or query given")
+    return ctx['products'] if isinstance(ctx['products'], list) else [ctx['products']]
 
-    hits = localizer_util.get_query_data(query)
-    if hits["total"] == 0:
-        time.sleep(random.randint(5, 21))
-        hits = localizer_util.get_query_data(query)
-        if hits["total"] == 0:
-            raise RuntimeError("No Acquisition Found that Matched the Criteria.")
-    else:
-        logger.info("get_acq_data_from_query : Found %s data" %hits["total"])
- 
-    for i in range (len(hits["hits"])):
-        acq_data = hits["hits"][i]["_source"]
-        #logger.info("\n%s" %acq_data)
-        acq = hits["hits"][i]["_id"]
-        status = check_slc_status(acq_data['metadata']['identifier'])
-        if status:
-            # status=1
-            logger.info("%s exists" %acq_data['metadata']['identifier'])
-            acq_info[acq]=get_acq_object(acq, acq_data, 1)
-        else:
-            #status = 0
-            logger.info("%s does NOT exist"%acq_data['metadata']['identifier'])
-            acq_info[acq]=get_acq_object(acq, acq_data, 0)
-    
-    return acq_info 
 
 def resolve_source(ctx_file):
     """Resolve best URL from acquisition."""
@@ -400,7 +715,9 @@ def resolve_source(ctx_file):
     
     acq_info = {}
 
-    acq_list = ctx['products'] if isinstance(ctx['products'], list) else [ctx['products']]
+    # localize the acquisitions matching an ES query, e.g. {"query": {...}}, instead of a product list
+    query = get_json_param(ctx, 'query')
+    acq_list = get_products(ctx, ctx_file) if query is None else get_acq_ids_from_query(query)
     logger.info("Acq List Type : %s" %type(acq_list))
 
     spyddder_sling_extract_version = ctx.get('spyddder_sling_extract_version', 'develop')
@@ -417,41 +734,195 @@ def resolve_source(ctx_file):
     prod_dates = []
     index_suffix = "S1-IW_ACQ"
 
+    global empty_result_retry_seconds, empty_result_refresh, sleep_seconds
+    empty_result_retry_seconds = float(ctx.get('empty_result_retry_seconds', empty_result_retry_seconds))
+    empty_result_refresh = str(ctx.get('empty_result_refresh', empty_result_refresh)).lower() == "true"
+    sleep_seconds = int(ctx.get('poll_interval_seconds', sleep_seconds))
+
+    # block until the SLCs are localized instead of returning right after submission
+    wait = str(ctx.get('wait', False)).lower() == "true"
+
+    # coalesce sling requests for the same SLC with other localizers: "es", "local" or unset
+    lease_store = sling_lease.get_lease_store(ctx.get('sling_lease_store'), localizer_util.get_conf('JOBS_ES_URL'))
+
+    # spill SLCs from backlogged ASF workers to the ESA queue, e.g. {"policy": "balanced", "spill_ratio": 0.5}
+    router = queue_routing.get_queue_router(get_json_param(ctx, 'queue_routing'), localizer_util.get_conf('JOBS_ES_URL'))
+
+    # order submissions and spread job priorities, e.g. {"sort_keys": ["-urgency", "starttime"], "urgency": {...}}
+    schedule_cfg = get_json_param(ctx, 'schedule')
+
+    # master/slave acquisitions of the interferogram configs, to localize and report pair by pair
+    pair_list = get_json_param(ctx, 'ifg_pairs')
 
-    return sling(acq_list, spyddder_sling_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version)
+    # localize large product lists in this many parallel processes
+    shards = int(ctx.get('shards') or 1)
+    if pair_list or shards > 1:
+        # pairs and shards need the whole list up front
+        acq_list = list(OrderedDict.fromkeys(acq_list))
+    if shards > 1:
+        return sling_sharded(shards, acq_list, spyddder_sling_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version, wait, lease_store, router, schedule_cfg, pair_list)
 
+    return sling(acq_list, spyddder_sling_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version, wait, lease_store, router, schedule_cfg, pair_list)
 
 
-def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version):
+
+def plan(ctx_file):
+    """Write the localization plan of the products of the context to PLAN_FILE, without submitting anything."""
+
+    with open(ctx_file) as f:
+        ctx = json.load(f)
+
+    query = get_json_param(ctx, 'query')
+    acq_list = get_products(ctx, ctx_file) if query is None else get_acq_ids_from_query(query)
+    router = queue_routing.get_queue_router(get_json_param(ctx, 'queue_routing'), localizer_util.get_conf('JOBS_ES_URL'))
+    localization_plan = plan_localization(acq_list, ctx['esa_download_queue'], ctx['asf_ngap_download_queue'], router, get_json_param(ctx, 'plan'))
+    with open(PLAN_FILE, 'w') as f:
+        json.dump(localization_plan, f, indent=2)
+    logger.info("Localization plan written to %s" %PLAN_FILE)
+    return localization_plan
+
+
+def probe_asf_slcs(identifiers, threads=PLAN_PROBE_THREADS):
+    """
+    Probe the ASF datapool for many SLCs concurrently, over pooled connections.
+    :return: dict of identifier to tuple(status code, url, size) of probe_asf_slc;
+             all None if the probe failed, which routes the SLC to ESA
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=threads, pool_maxsize=threads)
+    session.mount("https://", adapter)
+
+    def probe(identifier):
+        try:
+            return identifier, acquisition_localizer_single.probe_asf_slc(identifier, session)
+        except requests.RequestException as e:
+            logger.info("ASF probe of %s failed : %s" %(identifier, str(e)))
+            return identifier, (None, None, None)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return dict(executor.map(probe, identifiers))
+
+
+def plan_localization(acq_list, esa_download_queue, asf_ngap_download_queue, router=None, plan_cfg=None):
+    """
+    Work out how acq_list would be localized: which SLCs need slinging, their route,
+    estimated bytes and estimated duration, and the totals per queue.
+    :param plan_cfg: optional estimates, e.g. {"slc_bytes": ..., "mbytes_per_sec": {"asf": 50, "scihub": 10},
+                     "overhead_sec": 300, "probe_threads": 64, "min_history": 10}
+    Durations are the mean of the ones the SLC ledger recorded for the route, once it
+    has min_history of them, and estimated from the bytes and rates otherwise.
+    """
+    plan_cfg = plan_cfg or {}
+    slc_bytes = plan_cfg.get('slc_bytes', DEFAULT_SLC_BYTES)
+    mbytes_per_sec = dict(ROUTE_MBYTES_PER_SEC, **plan_cfg.get('mbytes_per_sec', {}))
+    overhead_sec = plan_cfg.get('overhead_sec', SLING_OVERHEAD_SEC)
+    ledger = slc_ledger.get_slc_ledger()
+    history = ledger.duration_stats() if ledger else {}
+    min_history = plan_cfg.get('min_history', PLAN_MIN_HISTORY)
+
+    total = 0
+    slcs = []
+    queues = OrderedDict()
+    # acq_list may be a lazily read product list, so it is planned batch by batch
+    planned = set()
+    for acq_info in iter_acq_info(acq_list, planned):
+        acq_info = OrderedDict((acq_id, acq) for acq_id, acq in acq_info.items() if acq_id not in planned)
+        planned.update(acq_info)
+        total += len(acq_info)
+        to_sling = [ acq for acq in acq_info.values() if not acq.localized ]
+        for acq in to_sling:
+            if acq.dataset != "acquisition-S1-IW_SLC":
+                raise RuntimeError("Unknown acquisition dataset: {}".format(acq.dataset))
+        probes = probe_asf_slcs([ acq.identifier for acq in to_sling ], plan_cfg.get('probe_threads', PLAN_PROBE_THREADS))
+
+        for acq in to_sling:
+            status_code, asf_url, size = probes[acq.identifier]
+            url, queue, url_type = acquisition_localizer_single.route_s1_slc(acq.identifier, acq.download_url, asf_ngap_download_queue,
+                                                                              esa_download_queue, status_code, asf_url, router)
+            est_bytes = size or slc_bytes
+            if history.get(url_type, {}).get('count', 0) >= min_history:
+                est_sec = history[url_type]['mean_sec']
+            else:
+                est_sec = overhead_sec + est_bytes / (mbytes_per_sec[url_type] * 1024**2)
+            slcs.append({
+                "acquisition": acq.acq_id,
+                "identifier": acq.identifier,
+                "url_type": url_type,
+                "queue": queue,
+                "url": url,
+                "bytes": est_bytes,
+                "size_known": size is not None,
+                "duration_sec": round(est_sec)
+            })
+            totals = queues.setdefault(queue, { "count": 0, "bytes": 0, "duration_sec": 0 })
+            totals["count"] += 1
+            totals["bytes"] += est_bytes
+            totals["duration_sec"] += round(est_sec)
+
+    for queue, totals in queues.items():
+        logger.info("Plan : %s SLCs, %.1f GB, %.1f job hours on %s" %(totals["count"], totals["bytes"] / 1024.**3, totals["duration_sec"] / 3600., queue))
+    logger.info("Plan : %s of %s acquisitions already localized" %(total - len(slcs), total))
+    return {
+        "total": total,
+        "localized": total - len(slcs),
+        "to_sling": len(slcs),
+        "queues": queues,
+        "duration_history": history,
+        "slcs": slcs
+    }
+
+
+def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version, wait=False, lease_store=None, router=None, schedule_cfg=None, pair_list=None, checkpoint=None):
     '''
 	This function checks if any ACQ that has not been ingested yet and sling them.
+	If wait is set, it then blocks until the sling jobs are done and returns the localized data.
+	If a lease_store is given, SLCs already claimed by another localizer are attached to its sling job.
+	If a router is given, it picks the download queue based on the queues' backlog.
+	If schedule_cfg is given, submissions are ordered and prioritized by it (see scheduling.schedule).
+	If pair_list is given, SLCs are slung pair by pair and each pair is reported once all its SLCs are localized.
+	If a checkpoint is given, the sling jobs of an earlier run are reused and the new ones recorded in it.
+	acq_list may be any iterable, e.g. a lazily read product list file; it is looked up and submitted
+	in batches of product_list.PRODUCT_BATCH_SIZE. With pair_list, it must be a list, and with pair_list
+	or schedule_cfg all of it is looked up before submitting, so pairs and ordering span the whole list.
     '''
     global sling_completion_max_sec
 
-    acq_info = get_acq_data_from_list(acq_list)
-
     #logger.info("acq_info type: %s : %s" %(type(acq_info), len(acq_info) ))
     #logger.info(acq_info)
     logger.info("%s : %s" %(type(spyddder_extract_version), spyddder_extract_version))
-    # acq_info has now all the ACQ's status. Now submit the Sling job for the one's whose status = 0 and update the slc_info with job id
+    tracker = AcqTracker(OrderedDict())
+    acq_info = tracker.acq_info
+    pairs = ifg_pairs.PairTracker(pair_list, acq_list) if pair_list else None
+    writer = LocalizedDataWriter(pairs=pairs)
+    checkpoint_jobs = checkpoint.load() if checkpoint is not None else {}
     no_of_localize_job = 0
-    logger.info("acquisition-localizer-multi : total acq in list : %s" %len(list(acq_info.keys())))
-    for acq_id in list(acq_info.keys()):
-        #acq_info[acq_id]['localized'] = False
-        if not acq_info[acq_id]['localized']:
-            acq_data = acq_info[acq_id]['acq_data']
-            job_id = submit_sling_job(spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, acq_data, job_priority)
-            no_of_localize_job = no_of_localize_job + 1
-            acq_info[acq_id]['job_id'] = job_id
-            job_status, new_job_id  = get_job_status(job_id)
-            acq_info[acq_id]['job_id'] = new_job_id
-            acq_info[acq_id]['job_status'] = job_status
-
+    acq_batches = iter_acq_info(acq_list, acq_info)
+    if pairs is not None or schedule_cfg:
+        acq_batches = [ OrderedDict(item for batch_info in acq_batches for item in batch_info.items()) ]
+    for batch_info in acq_batches:
+        batch_info = OrderedDict((acq_id, acq) for acq_id, acq in batch_info.items() if acq_id not in acq_info)
+        if len(batch_info) == 0:
+            continue
+        tracker.add(batch_info)
+        writer.write([ acq for acq in batch_info.values() if acq.localized ])
+        # reattach to the sling jobs of earlier runs, the ones of this shard's checkpoint first
+        jobs = get_ledger_jobs(batch_info.values())
+        jobs.update(checkpoint_jobs)
+        attach_to_jobs(tracker, jobs, batch_info.values())
+        # batch_info has now all the ACQ's status. Now submit the Sling job for the one's whose status = 0 and update the slc_info with job id
+        no_of_localize_job += submit_pending(tracker, spyddder_extract_version, esa_download_queue, asf_ngap_download_queue, job_priority,
+                                             lease_store, router, schedule_cfg, pairs, checkpoint, batch_info.values())
+    logger.info("acquisition-localizer-multi : total acq in list : %s" %len(acq_info))
 
     logger.info("No of sling job : %s" %no_of_localize_job)
-    logger.info("All the sling jobs have been submitted, if needed. Exiting")
-    return True, []
-
+    if not wait:
+        logger.info("All the sling jobs have been submitted, if needed. Exiting")
+        writer.write_summary(tracker)
+        writer.close()
+        return True, []
+    logger.info("All the sling jobs have been submitted, if needed. Waiting for them to complete")
 
     sling_completion_max_sec_count = 2000 * no_of_localize_job
 
@@ -464,35 +935,28 @@ def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa
     sling_check_start_time = datetime.utcnow()
     while not all_done:
 
-        for acq_id in list(acq_info.keys()):
-            acq_data = acq_info[acq_id]['acq_data']
-            if not acq_info[acq_id]['localized']: 
-                job_status, job_id  = get_job_status(acq_info[acq_id]['job_id'])  
-                if job_status == "job-completed":
-                    logger.info("Success! sling job for slc : %s  with job id : %s COMPLETED!!" %(acq_data['metadata']['identifier'], job_id))
-                    acq_info[acq_id]['job_id'] = job_id
-                    acq_info[acq_id]['job_status'] = job_status
-                    acq_info[acq_id]['localized'] = check_slc_status(acq_data['metadata']['identifier'])
-
-                elif job_status == "job-failed":
-                    acq_info[acq_id]['job_status'] = job_status
-                    err_msg = "Error : Sling job %s FAILED" %job_id
-                    logger.info(err_msg)
-                    #raise RuntimeError(err_msg)
-
-                else:
-                    acq_info[acq_id]['job_id'] = job_id
-                    acq_info[acq_id]['job_status'] = job_status
-                    logger.info("Sling job for %s  : Job id : %s. Job Status : %s" %(acq_info[acq_id], acq_info[acq_id]['job_id'], acq_info[acq_id]['job_status']))
-
-        logger.info("Checking if all job completed")
-        all_done = check_all_job_completed(acq_info)
+        # only the outstanding jobs are polled, in batches, and only state changes are logged
+        to_poll = tracker.to_poll()
+        if pairs is not None:
+            to_poll = pairs.order(to_poll)
+        job_statuses = get_job_status_batch([ acq.job_id for acq in to_poll ])
+        completed = update_job_statuses(tracker, to_poll, job_statuses)
+        if len(completed) > 0:
+            confirm_localized(tracker, completed)
+            writer.write(completed)
+            release_leases(lease_store, completed)
+        record_ledger_states(tracker, to_poll)
+
+        logger.info("Checking if all job completed : %s" %tracker.summary())
+        all_done = tracker.all_jobs_done()
         if not all_done:
             now = datetime.utcnow()
             delta = (now - sling_check_start_time).total_seconds()
             logger.info("present job run time : %s secs. Timeout time : %s secs" %(delta, sling_completion_max_sec))
 
             if delta >= sling_completion_max_sec:
+                writer.write_summary(tracker)
+                writer.close()
                 raise RuntimeError("Error : Sling jobs NOT completed after %.2f hours!!" %(old_div(delta,3600)))
             logger.info("All job not completed. So sleeping for %s seconds" %sleep_seconds)
             time.sleep(sleep_seconds)
@@ -509,17 +973,21 @@ def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa
     while not all_exists:
         all_exists = True
         slcs_not_exist = []
-        for acq_id in list(acq_info.keys()):
-            if not acq_info[acq_id]['localized']:
-                acq_data = acq_info[acq_id]['acq_data']
-                acq_info[acq_id]['localized'] = check_slc_status(acq_data['metadata']['identifier'])
-		
-                if not acq_info[acq_id]['localized']:
-                    logger.info("%s NOT localized!!" %acq_data['metadata']['identifier'])
-                    all_exists = False
-                    slcs_not_exist.append(acq_id)
+        to_check = tracker.get(AcqTracker.COMPLETED) + tracker.get(AcqTracker.FAILED)
+        confirm_localized(tracker, to_check)
+        release_leases(lease_store, to_check)
+        record_ledger_states(tracker, to_check)
+        writer.write(to_check)
+        for acq in to_check:
+            if not acq.localized:
+                logger.info("%s NOT localized!!" %acq.identifier)
+                all_exists = False
+                slcs_not_exist.append(acq.acq_id)
         break
 
+    writer.write_summary(tracker)
+    writer.close()
+
     error_str=""
     if not all_exists:
         now = datetime.utcnow()
@@ -532,6 +1000,9 @@ def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa
     #At this point we have all the slcs localized
     if all_exists:
         localized_data = get_output_data(acq_info)
+        with open(LOCALIZED_DATA_FILE, 'w') as f:
+            json.dump(localized_data, f, indent=2)
+        logger.info("Localized data of %s acquisitions written to %s" %(len(localized_data), LOCALIZED_DATA_FILE))
         return True, localized_data
     else:
         raise RuntimeError(error_str)
@@ -550,248 +1021,436 @@ def sling(acq_list, spyddder_extract_version, acquisition_localizer_version, esa
     ''' 
 
 
-def get_output_data(acq_info):
-    localized_data = {}
-    for acq_id in list(acq_info.keys()):
-        if not acq_info[acq_id]['localized']:
-            return None
-        acq_data = acq_info[acq_id]['acq_data']
-        slc_data = localizer_util.get_partial_grq_data(acq_data['metadata']['identifier'])['fields']['partial'][0] 
-        localize_url = ""
-        urls = slc_data['urls']
-        for url in urls:
-            localize_url = url
-            if localize_url.startswith('s3://'):
-                break
-        
-        acq_localized_data = {}
-        acq_localized_data['acquisition'] = acq_id
-        acq_localized_data['identifier'] = acq_data['metadata']['identifier']
-        acq_localized_data['localized'] = acq_info[acq_id]['localized']
-        acq_localized_data['urls'] = urls
-        acq_localized_data['localize_url'] = localize_url
-        localized_data[acq_id] = acq_localized_data
-    return localized_data
+def submit_pending(tracker, spyddder_extract_version, esa_download_queue, asf_ngap_download_queue, job_priority,
+                   lease_store=None, router=None, schedule_cfg=None, pairs=None, checkpoint=None, acqs=None):
+    """
+    Submit the sling jobs of the pending acquisitions of tracker (or of its records acqs)
+    in one batch, attaching to the jobs of other localizers where a lease_store says they
+    hold the SLC.
+    :return: number of sling jobs submitted
+    """
+    if acqs is None:
+        acqs = tracker.acq_info.values()
+    pending = [ acq for acq in acqs if tracker.state_of[acq.acq_id] == AcqTracker.PENDING ]
+    if pairs is not None:
+        schedule_cfg = pairs.schedule_cfg(schedule_cfg, job_priority)
+    pending, priorities = scheduling.schedule(pending, job_priority, schedule_cfg)
+
+    def resolve(acq):
+        return resolve_sling_job(spyddder_extract_version, esa_download_queue, asf_ngap_download_queue, acq, priorities[acq.acq_id], router)
+
+    if lease_store is None:
+        return submit_sling_jobs(tracker, lease_store, [ (acq, False) for acq in pending ], resolve, checkpoint)
+
+    # claim a few SLCs at a time, so the jobs of claimed leases are recorded on them soon after the claim;
+    # only the SLCs we sling ourselves are routed and resolved
+    submitted = 0
+    unattached = []
+    for i in range(0, len(pending), LEASE_CLAIM_BATCH):
+        to_submit = []
+        for acq in pending[i:i+LEASE_CLAIM_BATCH]:
+            claimed, lease = lease_store.claim(acq.identifier, LEASE_OWNER, is_stale=lease_job_failed)
+            if not claimed and lease.get('job_id'):
+                attach_to_lease(tracker, lease_store, acq, lease)
+            elif not claimed and lease:
+                # the holder has not submitted its job yet
+                unattached.append(acq)
+            else:
+                to_submit.append((acq, claimed))
+        submitted += submit_sling_jobs(tracker, lease_store, to_submit, resolve, checkpoint)
+
+    # give the holders of fresh leases a little time to record their jobs, and sling the rest ourselves
+    deadline = time.time() + LEASE_JOB_WAIT
+    while len(unattached) > 0 and time.time() < deadline:
+        time.sleep(LEASE_POLL_SEC)
+        waiting = []
+        for acq in unattached:
+            lease, version = lease_store.get(acq.identifier)
+            if lease and lease.get('job_id'):
+                attach_to_lease(tracker, lease_store, acq, lease)
+            else:
+                waiting.append(acq)
+        unattached = waiting
+    if len(unattached) > 0:
+        logger.info("No sling job recorded on the leases of %s SLCs, slinging them anyway" %len(unattached))
+        submitted += submit_sling_jobs(tracker, lease_store, [ (acq, False) for acq in unattached ], resolve, checkpoint)
+    return submitted
 
 
-        
+def attach_to_lease(tracker, lease_store, acq, lease):
+    """Attach the record acq to the sling job of another localizer's lease."""
 
-def check_all_job_completed(acq_info):
-    all_done = True
-    for acq_id in list(acq_info.keys()):
-        if not acq_info[acq_id]['localized']:  
-            job_status = acq_info[acq_id]['job_status']
-            if not job_status == "job-completed":
-                if not job_status == "job-failed":
-                    logger.info("check_all_job_completed : %s NOT completed!! present status : %s" %(acq_info[acq_id]['job_id'], acq_info[acq_id]['job_status']))	
-                    all_done = False
-                    break
-    return all_done
-
-def check_failed_jobs(acq_info):
-    failed_jobs = []
-    for acq_id in list(acq_info.keys()):
-        if not acq_info[acq_id]['localized']:
-            job_status = acq_info[acq_id]['job_status']
-            if job_status == "job-failed":
-                logger.info("Failed SLC : %s" %acq_id)
-                failed_jobs.append(acq_id)
-    return failed_jobs
-
-
-
-
-def submit_sling_job(spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, acq_data, priority):
-    identifier = acq_data["metadata"]["identifier"]
-    dataset_type = acq_data["dataset_type"]
-    dataset = acq_data["dataset"]
-    download_url = acq_data["metadata"]["download_url"]
-    archive_filename = acq_data["metadata"]["archive_filename"]
-    aoi = "no_aoi"
+    logger.info("%s is being slung by %s, attaching to its job %s" %(acq.identifier, lease['owner'], lease['job_id']))
+    # a job not indexed yet reads as unknown and is polled until it shows up
+    job_status, new_job_id  = get_job_status_batch([lease['job_id']])[lease['job_id']]
+    tracker.set_job(acq, new_job_id, job_status)
+    if new_job_id != lease['job_id']:
+        # point the lease at the original job so other localizers attach to it directly
+        lease_store.set_job(acq.identifier, new_job_id)
+
+
+def submit_sling_jobs(tracker, lease_store, to_submit, resolve, checkpoint=None):
+    """
+    Resolve and submit the sling jobs of to_submit in one batch, recording each job on
+    its lease as soon as it is submitted.
+    :param to_submit: list of tuple(record, whether we hold the lease on its SLC)
+    :param resolve: function of a record returning its resolved sling job
+    :return: number of sling jobs submitted
+    """
+    if len(to_submit) == 0:
+        return 0
+
+    def on_submit(i, job_id):
+        acq, claimed = to_submit[i]
+        if claimed:
+            lease_store.set_job(acq.identifier, job_id)
+
+    # their status is picked up when polling
+    job_ids = acquisition_localizer_single.bulk_submit_hysds_jobs([ resolve(acq) for acq, claimed in to_submit ], on_submit=on_submit)
+    for (acq, claimed), job_id in zip(to_submit, job_ids):
+        logger.info("Submitted sling job %s for %s" %(job_id, acq.identifier))
+        tracker.set_job(acq, job_id, JobStatus.QUEUED.value)
+    if checkpoint is not None:
+        checkpoint.record([ (acq.acq_id, job_id) for (acq, claimed), job_id in zip(to_submit, job_ids) ])
+    ledger = slc_ledger.get_slc_ledger()
+    if ledger is not None:
+        ledger.record_requested([ (acq.identifier, acq.acq_id, job_id, acq.queue, acq.url_type)
+                                  for (acq, claimed), job_id in zip(to_submit, job_ids) ])
+    return len(job_ids)
+
+
+def update_job_statuses(tracker, to_poll, job_statuses):
+    """
+    Apply polled job statuses to the records of to_poll, logging state changes only.
+    :param job_statuses: dict of job id to tuple(job_status, job_id) of get_job_status_batch
+    :return: records whose sling job has just completed
+    """
+    completed = []
+    for acq in to_poll:
+        job_status, job_id  = job_statuses[acq.job_id]
+        if not tracker.set_job(acq, job_id, job_status):
+            continue
+        if acq.job_status == JobStatus.COMPLETED:
+            logger.info("Success! sling job for slc : %s  with job id : %s COMPLETED!!" %(acq.identifier, job_id))
+            completed.append(acq)
+
+        elif tracker.state_of[acq.acq_id] == AcqTracker.FAILED:
+            err_msg = "Error : Sling job %s FAILED" %job_id
+            logger.info(err_msg)
+            #raise RuntimeError(err_msg)
 
-    return acquisition_localizer_single.resolve_source(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, spyddder_extract_version,archive_filename, priority, aoi)
+        else:
+            logger.info("Sling job for %s  : Job id : %s. Job Status : %s" %(acq.identifier, acq.job_id, acq.job_status.value))
+    return completed
 
 
-def submit_sling_job2(spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, acq_data, priority):
+def confirm_localized(tracker, acqs):
+    """Check in one batch whether the SLCs of acqs exist now and update tracker."""
 
-    """Map function for spyddder-man extract job."""
+    slc_status = get_slc_status_batch([ acq.identifier for acq in acqs ], retry=True)
+    for acq in acqs:
+        tracker.set_localized(acq, slc_status[acq.identifier])
 
-    #acquisition_localizer_version = "master"
-    #spyddder_extract_version = "develop"
-    job_submit_url = '%s/mozart/api/v0.1/job/submit' % MOZART_URL
 
-    # set job type and disk space reqs
-    job_type = "job-acquisition_localizer_single:{}".format(acquisition_localizer_version)
-    logger.info("\nSubmitting job of type : %s" %job_type)
-     # set job type and disk space reqs
-    disk_usage = "10GB"
-    #logger.info(acq_data)
-    #acq_id = acq_data['acq_id']
+def release_leases(lease_store, acqs):
+    """Release the sling leases of the SLCs of acqs that are localized; nobody needs to sling them any more."""
 
-    # set job queue
-    job_queue = "system-jobs-queue" 
-    rule = {
-        "rule_name": "acquisition_localizer_multi-sling",
-        "queue": job_queue,
-        "priority": priority,
-        "kwargs":'{}'
-    }
+    if lease_store is not None:
+        for acq in acqs:
+            if acq.localized:
+                lease_store.release(acq.identifier)
 
-    sling_job_name = "sling-%s-%s" %(job_type, acq_data["metadata"]["identifier"])
-
-
-    params = [
-	{
-            "name": "workflow",
-            "from": "value",
-            "value": "acquisition_localizer.sf.xml"
-        },
-        {
-            "name": "asf_ngap_download_queue",
-            "from": "value",
-            "value": asf_ngap_download_queue
-        },
-        {
-            "name": "esa_download_queue",
-            "from": "value",
-            "value": esa_download_queue
-        },
-        {
-            "name": "spyddder_extract_version",
-            "from": "value",
-            "value": spyddder_extract_version
-        },
-        {
-            "name": "dataset_type",
-            "from": "value",
-            "value": acq_data["dataset_type"]
-        },
-        {
-            "name": "dataset",
-            "from": "value",
-            "value": acq_data["dataset"]
-        },
-        {
-            "name": "identifier",
-            "from": "value",
-            "value": acq_data["metadata"]["identifier"]
-        },
-        {
-            "name": "download_url",
-            "from": "value",
-            "value": acq_data["metadata"]["download_url"]
-        },
-        {
-            "name": "archive_filename",
-            "from": "value",
-            "value": acq_data["metadata"]["archive_filename"]
-        },
-        {
-            "name": "prod_met",
-            "from": "value",
-            "value": acq_data["metadata"]
-        }
-    ]
-    
 
-    logger.info("PARAMS : %s" %params)
-    logger.info("RULE : %s"%rule)
-    logger.info(job_type)
-    logger.info(sling_job_name)
+def record_ledger_states(tracker, acqs):
+    """Record the current state of the SLCs of acqs in the SLC ledger, timing the sling jobs that are done."""
 
-    mozart_job_id = submit_mozart_job({}, rule,hysdsio={"id": "internal-temporary-wiring", "params": params, "job-specification": job_type}, job_name=sling_job_name)
-    logger.info("\nSubmitted sling job with id %s for  %s" %(acq_data["metadata"]["identifier"], mozart_job_id))
+    ledger = slc_ledger.get_slc_ledger()
+    if ledger is not None:
+        now = time.time()
+        done = (AcqTracker.COMPLETED, AcqTracker.LOCALIZED)
+        ledger.record_states([ (acq.identifier, acq.acq_id, tracker.state_of[acq.acq_id],
+                                now if tracker.state_of[acq.acq_id] in done else None) for acq in acqs ])
 
-    return mozart_job_id
 
-def check_ES_status(doc_id):
+def record_newly_localized(ledger, entries, localized):
     """
-    There is a latency in the update of ES job status after
-    celery signals job completion.
-    To handle that case, we much poll ES (after sciflo returns status after blocking)
-    until the job status is correctly reflected.
-    :param doc_id: ID of the Job ES doc
-    :return: True  if the ES has updated job status within 5 minutes
-            otherwise raise a run time error
+    Record SLCs found localized whose ledger entry says otherwise, e.g. slung by an earlier
+    run that did not wait for its jobs, timing their sling jobs by the job docs' end time.
+    :param entries: ledger entries of get_many
+    :param localized: list of tuple(identifier, acq_id) of the SLCs found localized
     """
-    es_url = app.conf['JOBS_ES_URL']
-    es_index = "job_status-current"
-    query = {
-        "_source": [
-                   "status"
-               ],
-        "query": {
-            "bool": {
-                "must": [
-                    {"term": {"_id": doc_id}}
-                ]
-            }
-        }
-    }
+    localized = [ (identifier, acq_id) for identifier, acq_id in localized
+                  if entries.get(identifier, {}).get('state') != slc_ledger.LOCALIZED ]
+    job_ids = list(set(entries[identifier]['job_id'] for identifier, acq_id in localized
+                       if identifier in entries and entries[identifier]['job_id']))
+    end_times = get_job_end_times(job_ids)
+    ledger.record_states([ (identifier, acq_id, slc_ledger.LOCALIZED,
+                            end_times.get(entries[identifier]['job_id']) if identifier in entries else None)
+                           for identifier, acq_id in localized ])
+
+
+def get_job_end_times(job_ids):
+    """Return dict of job id to the epoch time the job ended, for the finished jobs Mozart still has."""
+
+    end_times = {}
+    for i in range(0, len(job_ids), localizer_util.MGET_BATCH_SIZE):
+        docs = get_job_docs(job_ids[i:i+localizer_util.MGET_BATCH_SIZE], JOB_END_FIELDS)
+        for job_id, doc in docs.items():
+            time_end = doc.get('job', {}).get('job_info', {}).get('time_end')
+            if time_end:
+                end_times[job_id] = calendar.timegm(datetime.strptime(time_end[:19], "%Y-%m-%dT%H:%M:%S").timetuple())
+    return end_times
+
+
+def get_ledger_jobs(acqs):
+    """Return dict of acquisition id to the sling job the ledger has in flight for its SLC, if Mozart still has it."""
+
+    ledger = slc_ledger.get_slc_ledger()
+    if ledger is None:
+        return {}
+    entries = ledger.get_many([ acq.identifier for acq in acqs if not acq.localized ])
+    jobs = {}
+    for acq in acqs:
+        entry = entries.get(acq.identifier)
+        if not acq.localized and entry and entry['job_id'] and entry['state'] in slc_ledger.IN_FLIGHT:
+            jobs[acq.acq_id] = entry['job_id']
+    # jobs of long gone runs may have been purged from Mozart, only realtime gets are used to find them
+    job_ids = list(set(jobs.values()))
+    docs = {}
+    for i in range(0, len(job_ids), localizer_util.MGET_BATCH_SIZE):
+        docs.update(get_job_docs(job_ids[i:i+localizer_util.MGET_BATCH_SIZE]))
+    return { acq_id: job_id for acq_id, job_id in jobs.items() if job_id in docs }
+
+
+def attach_to_jobs(tracker, jobs, acqs):
+    """
+    Attach the pending records of acqs to sling jobs of earlier runs, unless those failed.
+    :param jobs: dict of acquisition id to job id, e.g. of SlingCheckpoint.load or get_ledger_jobs
+    """
+    pending = [ acq for acq in acqs if tracker.state_of[acq.acq_id] == AcqTracker.PENDING and acq.acq_id in jobs ]
+    if len(pending) == 0:
+        return
+    job_statuses = get_job_status_batch([ jobs[acq.acq_id] for acq in pending ])
+    resumed = 0
+    for acq in pending:
+        job_status, job_id = job_statuses[jobs[acq.acq_id]]
+        if JobStatus.from_str(job_status) in (JobStatus.FAILED, JobStatus.REVOKED, JobStatus.OFFLINE, JobStatus.UNKNOWN):
+            # failed, or no longer in Mozart: sling it again
+            continue
+        tracker.set_job(acq, job_id, job_status)
+        resumed += 1
+    logger.info("Reattached to %s sling jobs of earlier runs" %resumed)
 
-    #ES = elasticsearch.Elasticsearch(es_url)
-    #result = ES.search(index=es_index, body=query)
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
 
-    if r.status_code != 200:
-        err_str = "Failed to query %s:\n%s" % (es_url, r.text)
-        err_str += "\nreturned: %s" % r.text
-        print(err_str)
-        print("query: %s" % json.dumps(query, indent=2))
-        #r.raise_for_status()
-        raise RuntimeError(err_str)
+# shards of the running sling_sharded call, inherited by its forked shard processes
+_shard_tasks = []
+
+
+def run_shard(shard):
+    """Localize one shard in its own directory. Runs in a forked process."""
+
+    shard_dir, acq_list, pair_list, args, kwargs = _shard_tasks[shard]
+    os.chdir(shard_dir)
+    try:
+        sling(acq_list, *args, pair_list=pair_list, checkpoint=sharding.SlingCheckpoint(), **kwargs)
+        return shard, None
+    except Exception as e:
+        logger.info("Shard %s failed : %s\n%s" %(shard, str(e), traceback.format_exc()))
+        return shard, str(e)
 
+
+def sling_sharded(shards, acq_list, spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version, wait=False, lease_store=None, router=None, schedule_cfg=None, pair_list=None):
     '''
-    if r.status_code != 200:
-        print("Failed to query %s:\n%s" % (es_url, r.text))
-        print("query: %s" % json.dumps(query, indent=2))
-        print("returned: %s" % r.text)
-        r.raise_for_status()
+	Partition acq_list into shards localized by sling in parallel processes, each in its own
+	directory with its own checkpoint, and merge their outputs. Failed shards are rerun from
+	their checkpoint up to MAX_TRY times.
     '''
+    global _shard_tasks
+
+    args = (spyddder_extract_version, acquisition_localizer_version, esa_download_queue, asf_ngap_download_queue, job_priority, job_type, job_version)
+    kwargs = { "wait": wait, "lease_store": lease_store, "router": router, "schedule_cfg": schedule_cfg }
+    _shard_tasks = []
+    for i, (shard_acqs, shard_pairs) in enumerate(sharding.partition(acq_list, shards, pair_list)):
+        shard_dir = os.path.abspath(sharding.SHARD_DIR_TMPL % i)
+        if not os.path.isdir(shard_dir):
+            os.makedirs(shard_dir)
+        _shard_tasks.append((shard_dir, shard_acqs, shard_pairs, args, kwargs))
+        logger.info("Shard %s : %s acquisitions, %s pairs" %(i, len(shard_acqs), len(shard_pairs)))
+
+    # fork so the shards inherit the lease store, router and loaded config
+    import multiprocessing
+    pool_ctx = multiprocessing.get_context("fork")
+    remaining = list(range(len(_shard_tasks)))
+    errors = {}
+    for attempt in range(MAX_TRY):
+        pool = pool_ctx.Pool(processes=len(remaining), maxtasksperchild=1)
+        try:
+            results = pool.map(run_shard, remaining, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        errors = { shard: err for shard, err in results if err is not None }
+        remaining = sorted(errors)
+        if len(remaining) == 0:
+            break
+        logger.info("Shards %s failed on attempt %s" %(remaining, attempt + 1))
+
+    localized_data = merge_shard_outputs(acq_list, pair_list, wait and len(errors) == 0)
+    if len(errors) > 0:
+        raise RuntimeError("Error : %s of %s shards failed :\n%s" %(len(errors), len(_shard_tasks),
+                           "\n".join("shard %s : %s" %(shard, err) for shard, err in sorted(errors.items()))))
+    return True, localized_data if wait else []
+
+
+def merge_shard_outputs(acq_list, pair_list, merge_data):
+    """
+    Merge the localized data streams of the shards into one with a single summary, and
+    their localized data files into one if merge_data.
+    :return: merged localized data, or None if not merge_data
+    """
+    localized = set()
+    pairs_complete = 0
+    with open(LOCALIZED_STREAM_FILE, 'w') as out:
+        for shard_dir, shard_acqs, shard_pairs, args, kwargs in _shard_tasks:
+            path = os.path.join(shard_dir, LOCALIZED_STREAM_FILE)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except ValueError: continue  # partial last line of a killed shard
+                    if record["type"] == "summary":
+                        continue
+                    if record["type"] == "acquisition":
+                        localized.add(record["acquisition"])
+                    else:
+                        pairs_complete += 1
+                    out.write(line)
+        summary = {
+            "type": "summary",
+            "total": len(acq_list),
+            "localized": len(localized),
+            "not_localized": [ acq_id for acq_id in acq_list if acq_id not in localized ],
+            "complete": len(localized) == len(acq_list)
+        }
+        if pair_list:
+            summary["pairs"] = { "total": len(pair_list), "complete": pairs_complete }
+        out.write(json.dumps(summary) + "\n")
+    logger.info("Merged localized data of %s shards : %s of %s acquisitions localized" %(len(_shard_tasks), len(localized), len(acq_list)))
+
+    if not merge_data:
+        return None
+    shard_data = {}
+    for shard_dir, shard_acqs, shard_pairs, args, kwargs in _shard_tasks:
+        with open(os.path.join(shard_dir, LOCALIZED_DATA_FILE)) as f:
+            shard_data.update(json.load(f))
+    localized_data = OrderedDict((acq_id, shard_data[acq_id]) for acq_id in acq_list)
+    with open(LOCALIZED_DATA_FILE, 'w') as f:
+        json.dump(localized_data, f, indent=2)
+    return localized_data
 
-    result = r.json()
 
+def get_output_data(acq_info):
+    for acq in acq_info.values():
+        if not acq.localized:
+            return None
+    return get_localized_data_batch(list(acq_info.values()))
 
-    sleep_seconds = 2
-    timeout_seconds = 300
-    # poll ES until job status changes from "job-started" or for the job doc to show up. The poll will timeout soon after 5 mins.
 
-    while len(result["hits"]["hits"]) == 0: #or str(result["hits"]["hits"][0]["_source"]["status"]) == "job-started":
-        if sleep_seconds >= timeout_seconds:
-            if len(result["hits"]["hits"]) == 0:
-                raise RuntimeError("ES taking too long to index job with id %s."%doc_id)
-            else:
-                raise RuntimeError("ES taking too long to update status of job with id %s."%doc_id)
-        time.sleep(sleep_seconds)
-        #result = ES.search(index=es_index, body=query)
+def get_localized_data_batch(acqs):
+    """Return dict of acquisition id to localized data for localized acquisition records."""
+
+    localized_data = {}
+    # fetch the urls of the localized SLCs in batches, only projecting the urls field
+    for i in range(0, len(acqs), localizer_util.MGET_BATCH_SIZE):
+        batch = acqs[i:i+localizer_util.MGET_BATCH_SIZE]
+        identifiers = [ acq.identifier for acq in batch ]
+        slc_docs = localizer_util.mget_docs(identifiers + [ identifier + "-pds" for identifier in identifiers ],
+                                            localizer_util.get_index(localizer_util.SLC_INDEX_SUFFIX), source=["urls"])
+        for acq in batch:
+            slc_doc = slc_docs.get(acq.identifier, slc_docs.get(acq.identifier + "-pds"))
+            if slc_doc is None:
+                raise RuntimeError("Failed to get urls of localized SLC : %s" %acq.identifier)
+            localized_data[acq.acq_id] = get_acq_localized_data(acq.acq_id, acq.identifier, acq.localized,
+                                                                slc_doc['_source'].get('urls', []))
+    return localized_data
+
+
+class LocalizedDataWriter(object):
+    """
+    Appends the localized data of each acquisition to an NDJSON file as soon as
+    its SLC is confirmed, so downstream jobs can start on the early ones. A
+    summary record is written last. With interferogram pairs, a pair record
+    follows the acquisition that completes the pair.
+    """
+
+    def __init__(self, path=LOCALIZED_STREAM_FILE, pairs=None):
+        self.path = path
+        self.pairs = pairs
+        self.written = set()
+        self.f = open(path, 'w')
+
+    def write_record(self, record):
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+
+    def write(self, acqs):
+        """Write the localized data of the records not written yet."""
+        acqs = [ acq for acq in acqs if acq.localized and acq.acq_id not in self.written ]
+        if len(acqs) == 0: return
+        localized_data = get_localized_data_batch(acqs)
+        for acq in acqs:
+            record = dict(localized_data[acq.acq_id], type="acquisition")
+            self.write_record(record)
+            self.written.add(acq.acq_id)
+            if self.pairs is not None:
+                for pair_id in self.pairs.set_localized([acq.acq_id]):
+                    self.write_record(self.pairs.get_pair_record(pair_id))
+                    logger.info("Pair %s localized" %pair_id)
+        logger.info("Wrote localized data of %s acquisitions to %s" %(len(acqs), self.path))
+
+    def write_summary(self, tracker):
+        summary = {
+            "type": "summary",
+            "total": len(tracker.acq_info),
+            "localized": tracker.count(AcqTracker.LOCALIZED),
+            "not_localized": [ acq_id for acq_id, state in tracker.state_of.items() if state != AcqTracker.LOCALIZED ],
+            "complete": tracker.count(AcqTracker.LOCALIZED) == len(tracker.acq_info)
+        }
+        if self.pairs is not None:
+            summary["pairs"] = self.pairs.summary()
+        self.write_record(summary)
+
+    def close(self):
+        self.f.close()
+
+
+def get_acq_localized_data(acq_id, identifier, localized, urls):
+    localize_url = ""
+    for url in urls:
+        localize_url = url
+        if localize_url.startswith('s3://'):
+            break
+
+    acq_localized_data = {}
+    acq_localized_data['acquisition'] = acq_id
+    acq_localized_data['identifier'] = identifier
+    acq_localized_data['localized'] = localized
+    acq_localized_data['urls'] = urls
+    acq_localized_data['localize_url'] = localize_url
+    return acq_localized_data
+
 
-        r = requests.post(search_url, data=json.dumps(query))
         
-        if r.status_code != 200:
-            err_str = "Failed to query %s:\n%s" % (es_url, r.text)
-            err_str += "\nreturned: %s" % r.text
-            print(err_str)
-            print("query: %s" % json.dumps(query, indent=2))
-            #r.raise_for_status()
-            raise RuntimeError(err_str)
-        '''
-        if r.status_code != 200:
-            print("Failed to query %s:\n%s" % (es_url, r.text))
-            print("query: %s" % json.dumps(query, indent=2))
-            print("returned: %s" % r.text)
-            r.raise_for_status()
-        '''
 
-        result = r.json()
-        sleep_seconds = sleep_seconds * 2
+def resolve_sling_job(spyddder_extract_version, esa_download_queue, asf_ngap_download_queue, acq, priority, router=None):
+    """Resolve the sling job of an acquisition record without submitting it."""
+
+    aoi = "no_aoi"
+    route = acquisition_localizer_single.route_sling_job(acq.dataset_type, acq.identifier, acq.dataset, acq.download_url, asf_ngap_download_queue, esa_download_queue, router)
+    url, acq.queue, acq.url_type = route
+    return acquisition_localizer_single.resolve_sling_job(acq.dataset_type, acq.identifier, acq.dataset, acq.download_url, asf_ngap_download_queue, esa_download_queue, spyddder_extract_version, acq.archive_filename, priority, aoi, router, route)
 
-    logging.info("Job status updated on ES to %s"%str(result["hits"]["hits"][0]["_source"]["status"]))
-    return True
-    
 
 def main():
 
@@ -1,11 +1,8 @@
 #!/usr/bin/env python 
 from builtins import str
-import os, sys, time, json, requests, logging
-
-from hysds_commons.job_utils import resolve_hysds_job
-from hysds.celery import app
-from hysds_commons.job_utils import submit_hysds_job
-import osaka.main
+import os, sys, time, json, requests, logging, traceback
+import copy
+import localizer_util
 
 # set logger
 log_format = "[%(asctime)s: %(levelname)s/%(name)s/%(funcName)s] %(message)s"
@@ -23,12 +20,37 @@ logger.addFilter(LogFilter())
 
 BASE_PATH = os.path.dirname(__file__)
 
+ASF_DATAPOOL_URL_TMPL = "https://datapool.asf.alaska.edu/SLC/SA/{}.zip"
+
+# queue the orchestrator consumes job submissions from
+ORCHESTRATOR_QUEUE = "jobs_processed"
+
+# (job_type, queue) -> (resolved job, slc_id it was resolved for)
+_job_templates = {}
+
+
+# hysds_commons.job_utils loads the celery app, so it is imported on first use
+
+def resolve_hysds_job(*args, **kwargs):
+    from hysds_commons.job_utils import resolve_hysds_job
+    return resolve_hysds_job(*args, **kwargs)
+
+
+def submit_hysds_job(job):
+    from hysds_commons.job_utils import submit_hysds_job
+    return submit_hysds_job(job)
+
+
+def get_payload_hash(job):
+    from hysds_commons.job_utils import get_payload_hash
+    return get_payload_hash(job)
+
 
 def dataset_exists(id, index_suffix):
     """Query for existence of dataset by ID."""
 
     # es_url and es_index
-    es_url = app.conf.GRQ_ES_URL
+    es_url = localizer_util.get_grq_url()
     es_index = "grq_*_{}".format(index_suffix.lower())
     
     # query
@@ -69,7 +91,7 @@ def dataset_exists(id, index_suffix):
 def query_es(query, es_index):
     """Query ES."""
 
-    es_url = app.conf.GRQ_ES_URL
+    es_url = localizer_util.get_grq_url()
     rest_url = es_url[:-1] if es_url.endswith('/') else es_url
     url = "{}/{}/_search?search_type=scan&scroll=60&size=100".format(rest_url, es_index)
     #logger.info("url: {}".format(url))
@@ -239,23 +261,30 @@ def query_aoi_acquisitions(starttime, endtime, platform):
     return acq_info
     
 
-def resolve_s1_slc(identifier, download_url, asf_queue, esa_queue):
-    """Resolve S1 SLC using ASF datapool (ASF or NGAP). Fallback to ESA."""
-    url_type = "asf"
-
-    #asf_queue = "spyddder-sling-extract-asf"
-    #esa_queue = "spyddder-sling-extract-scihub"
+def probe_asf_slc(identifier, session=requests):
+    """Get the first 100 bytes of the SLC from the ASF datapool (ASF or NGAP).
+       Returns tuple(status code, url after redirects, SLC size in bytes or None)."""
 
-    # determine best url and corresponding queue by getting first 100 bytes
-    vertex_url = "https://datapool.asf.alaska.edu/SLC/SA/{}.zip".format(identifier)
+    vertex_url = ASF_DATAPOOL_URL_TMPL.format(identifier)
     headers = {"Range": "bytes=0-100"}
-    r = requests.get(vertex_url, allow_redirects=True, headers=headers)
-    logger.info("Status Code from ASF : %s" %r.status_code)
-    if asf_queue.upper() != "NA" and r.status_code in (200, 206):
-        url = r.url
+    r = session.get(vertex_url, allow_redirects=True, headers=headers)
+    # a ranged response tells the full size, e.g. "bytes 0-100/4512345678"
+    size = None
+    content_range = r.headers.get("Content-Range", "")
+    if "/" in content_range:
+        try: size = int(content_range.split("/")[-1])
+        except ValueError: pass
+    return r.status_code, r.url, size
+
+
+def route_s1_slc(identifier, download_url, asf_queue, esa_queue, status_code, asf_url, router=None):
+    """Pick the url and queue of an S1 SLC from the status of its ASF probe. Fallback to ESA."""
+
+    if asf_queue.upper() != "NA" and status_code in (200, 206):
+        url = asf_url
         queue = asf_queue
         url_type = "asf"
-    elif r.status_code == 404:
+    elif status_code == 404:
         url = download_url
         queue = esa_queue
         url_type = "scihub"
@@ -267,12 +296,30 @@ def resolve_s1_slc(identifier, download_url, asf_queue, esa_queue):
         url = download_url
         queue = esa_queue
         url_type = "scihub"
-    #url = r.url
-    #queue = asf_queue
-        #raise RuntimeError("Got status code {} from {}: {}".format(r.status_code, vertex_url, r.url))
+    if router is not None:
+        if url_type == "asf" and router.route(asf_queue, esa_queue) == esa_queue:
+            logger.info("ASF queue %s is backlogged, spilling %s to %s" %(asf_queue, identifier, esa_queue))
+            url = download_url
+            queue = esa_queue
+            url_type = "scihub"
+        elif url_type == "scihub":
+            router.record(esa_queue)
     return url, queue, url_type
 
 
+def resolve_s1_slc(identifier, download_url, asf_queue, esa_queue, router=None):
+    """Resolve S1 SLC using ASF datapool (ASF or NGAP). Fallback to ESA.
+       An optional queue_routing.QueueRouter may spill SLCs ASF serves to ESA."""
+
+    #asf_queue = "spyddder-sling-extract-asf"
+    #esa_queue = "spyddder-sling-extract-scihub"
+
+    # determine best url and corresponding queue by getting first 100 bytes
+    status_code, asf_url, size = probe_asf_slc(identifier)
+    logger.info("Status Code from ASF : %s" %status_code)
+    return route_s1_slc(identifier, download_url, asf_queue, esa_queue, status_code, asf_url, router)
+
+
 class DatasetExists(Exception):
     """Exception class for existing dataset."""
     pass
@@ -297,6 +344,20 @@ def resolve_source_from_ctx(ctx):
 
 def resolve_source(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, spyddder_extract_version, archive_filename, job_priority, aoi):
    
+    job = resolve_sling_job(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, spyddder_extract_version, archive_filename, job_priority, aoi)
+
+    try:
+        return submit_hysds_job(job)
+    except Exception as err:
+        err_msg = "ERROR running sling_extract_job : %s" %str(err)
+        logger.info(err_msg)
+        traceback.print_exc()
+        raise RuntimeError(err_msg)
+
+
+def route_sling_job(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, router=None):
+    """Route the acquisition's SLC to a download queue. Returns tuple(url, queue, url_type)."""
+
     # get settings
     '''
     settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'settings.json')
@@ -317,22 +378,28 @@ def resolve_source(dataset_type, identifier, dataset, download_url, asf_ngap_dow
         if dataset_exists(identifier, settings['ACQ_TO_DSET_MAP'][dataset]):
             raise DatasetExists("Dataset {} already exists.".format(identifier))
         '''
-        url, queue, url_type = resolve_s1_slc(identifier, download_url, asf_ngap_download_queue, esa_download_queue)
+        return resolve_s1_slc(identifier, download_url, asf_ngap_download_queue, esa_download_queue, router)
     else:
         raise RuntimeError("Unknown acquisition dataset: {}".format(dataset))
 
+
+def resolve_sling_job(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, spyddder_extract_version, archive_filename, job_priority, aoi, router=None, route=None):
+    """Route the acquisition's SLC to a download queue and resolve its sling extract job, without submitting it.
+       route optionally gives the tuple(url, queue, url_type) of route_sling_job, when it was routed already."""
+
+    if route is None:
+        route = route_sling_job(dataset_type, identifier, dataset, download_url, asf_ngap_download_queue, esa_download_queue, router)
+    url, queue, url_type = route
+
     try:
         #return extract_job(spyddder_extract_version, queue, url, archive_filename, identifier, time.strftime('%Y-%m-%d' ), job_priority, aoi)
-        return sling_extract_job(spyddder_extract_version, identifier, url_type, download_url, queue, archive_filename,  
-                time.strftime('%Y-%m-%d' ), job_priority, aoi)
+        return resolve_sling_extract_job(spyddder_extract_version, identifier, url_type, queue, job_priority)
     except Exception as err:
-        err_msg = "ERROR running sling_extract_job : %s" %str(err)
+        err_msg = "ERROR resolving sling_extract_job : %s" %str(err)
         logger.info(err_msg)
         traceback.print_exc()
         raise RuntimeError(err_msg)
 
-        #return extract_job(spyddder_extract_version, queue, url, archive_filename, identifier, time.strftime('%Y-%m-%d' ), job_priority, aoi)
-
 def resolve_source_from_ctx_file(ctx_file):
     """Resolve best URL from acquisition."""
 
@@ -343,19 +410,20 @@ def sling_extract_job(sling_extract_version, slc_id, url_type, download_url, que
                 prod_date, priority, aoi, wuid=None, job_num=None):
     """Map function for spyddder-man extract job."""
 
+    job = resolve_sling_extract_job(sling_extract_version, slc_id, url_type, queue, priority, wuid, job_num)
+    return submit_hysds_job(job)
+
+
+def resolve_sling_extract_job(sling_extract_version, slc_id, url_type, queue, priority, wuid=None, job_num=None):
+    """Resolve the spyddder-man sling extract job for slc_id without submitting it."""
+
     # set job type and disk space reqs
     #job_type = "job-spyddder-extract:{}".format(spyddder_extract_version)
     logger.info("\nsling_extract_job for :%s" %slc_id)
     job_type = "job-spyddder-sling-extract-{}:{}".format(url_type, sling_extract_version)
 
     # resolve hysds job
-    params = {
-        "slc_id": slc_id
-    }
-
-
-    job = resolve_hysds_job(job_type, queue, priority=priority, params=params,
-                            job_name="%s-%s" % (job_type, slc_id))
+    job = get_resolved_job(job_type, queue, priority, slc_id)
 
 
     # add workflow info
@@ -364,7 +432,79 @@ def sling_extract_job(sling_extract_version, slc_id, url_type, download_url, que
     job['payload']['_sciflo_job_num'] = job_num
     #print("job: {}".format(json.dumps(job, indent=2)))
 
-    return submit_hysds_job(job)
+    return job
+
+
+def publish_hysds_job(job, producer):
+    """Publish a resolved job to the orchestrator over an already acquired broker producer."""
+
+    from hysds.orchestrator import submit_job
+    return submit_job.apply_async((job,), queue=ORCHESTRATOR_QUEUE, producer=producer).id
+
+
+def bulk_submit_hysds_jobs(jobs, publish=publish_hysds_job, on_submit=None):
+    """
+    Submit resolved jobs in one batch, publishing all of them over a single
+    broker connection instead of a round trip per job.
+    :param jobs: list of resolved jobs
+    :param publish: function(job, producer) returning the job id; lets a
+                    local broker stand-in replace the orchestrator
+    :param on_submit: optional function(index, job_id) called as soon as each job is submitted
+    :return: list of job ids, in the order of jobs
+    """
+
+    job_ids = []
+    try:
+        with localizer_util.get_app().producer_or_acquire() as producer:
+            for job in jobs:
+                job_ids.append(publish(job, producer))
+                if on_submit is not None: on_submit(len(job_ids) - 1, job_ids[-1])
+    except Exception as err:
+        logger.info("Bulk submission failed after %s of %s jobs, submitting the rest one by one : %s" %(len(job_ids), len(jobs), str(err)))
+        for job in jobs[len(job_ids):]:
+            job_ids.append(submit_hysds_job(job))
+            if on_submit is not None: on_submit(len(job_ids) - 1, job_ids[-1])
+    logger.info("Submitted %s jobs" %len(job_ids))
+    return job_ids
+
+
+def replace_str(obj, old, new):
+    """Return a copy of obj with old replaced by new in every string it contains."""
+
+    if isinstance(obj, str):
+        return obj.replace(old, new)
+    if isinstance(obj, dict):
+        return { replace_str(k, old, new): replace_str(v, old, new) for k, v in obj.items() }
+    if isinstance(obj, list):
+        return [ replace_str(i, old, new) for i in obj ]
+    return copy.deepcopy(obj)
+
+
+def get_resolved_job(job_type, queue, priority, slc_id):
+    """
+    Resolve the sling extract job for slc_id. The job spec and hysds-io are only
+    fetched and resolved once per (job_type, queue); later SLCs get a copy of that
+    job with the SLC id swapped in (params and command line), their own job name
+    and priority, and the payload hash recomputed so dedup tells their jobs apart.
+    """
+
+    key = (job_type, queue)
+    if key in _job_templates:
+        template, template_slc_id = _job_templates[key]
+        job = replace_str(template, template_slc_id, slc_id)
+        job['payload']['slc_id'] = slc_id
+        job['job_name'] = "%s-%s" % (job_type, slc_id)
+        job['priority'] = priority
+        job['payload_hash'] = get_payload_hash(job)
+        return job
+
+    params = {
+        "slc_id": slc_id
+    }
+    job = resolve_hysds_job(job_type, queue, priority=priority, params=params,
+                            job_name="%s-%s" % (job_type, slc_id))
+    _job_templates[key] = (copy.deepcopy(job), slc_id)
+    return job
 
 
 def extract_job(spyddder_extract_version, queue, localize_url, file, prod_name,
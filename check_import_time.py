@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Check that the localizer modules import within a time budget and without
+loading the HySDS celery app or other heavy dependencies, which they must only
+import on first use. Each module is imported in a fresh interpreter so that
+nothing imported by an earlier module hides its cost.
+
+Usage: check_import_time.py [--budget-ms MS] [module ...]
+Exits with status 1 if any module is over budget or imports a deferred module.
+"""
+import os, sys, json, argparse, subprocess
+
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = [ "acquisition_localizer_single", "acquisition_localizer_multi", "localizer_util",
+            "sling_acquisitions", "util" ]
+
+# modules that take seconds to import or load config, and must not be imported at module import
+DEFERRED_MODULES = [ "hysds.celery", "hysds.orchestrator", "hysds_commons.job_utils", "osaka.main", "multiprocessing" ]
+
+IMPORT_BUDGET_MS = 250
+
+MEASURE_TMPL = """
+import sys, time, json
+start = time.time()
+import %s
+print(json.dumps({ "ms": (time.time() - start) * 1000, "deferred": [ m for m in %s if m in sys.modules ] }))
+"""
+
+
+def measure(module):
+    """Import module in a fresh interpreter. Returns dict with the import time and the deferred modules it loaded."""
+
+    out = subprocess.check_output([ sys.executable, "-c", MEASURE_TMPL %(module, json.dumps(DEFERRED_MODULES)) ], cwd=BASE_PATH)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the localizer modules.")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="import time budget per module")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to check")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        result = measure(module)
+        errors = []
+        if result["ms"] > args.budget_ms:
+            errors.append("over budget of %.0f ms" %args.budget_ms)
+        if result["deferred"]:
+            errors.append("imports %s" %", ".join(result["deferred"]))
+        print("%-32s %8.1f ms  %s" %(module, result["ms"], "; ".join(errors) if errors else "ok"))
+        failed = failed or len(errors) > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
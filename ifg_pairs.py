@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Interferogram pair awareness for the multi acquisition localizer.
+
+The acquisitions of a multi localizer run usually make up the master and
+slave sets of interferogram configs, and a pair is only useful downstream once
+all of its SLCs are localized. Given the pairs, PairTracker ranks the
+acquisitions so sling jobs are submitted (and polled) pair by pair, starting
+with the pairs closest to completion, and reports each pair as soon as its
+last SLC is localized.
+
+Pairs come from the ctx "ifg_pairs" setting, e.g.
+[{"id": "<ifg-cfg id>", "master_acquisitions": [...], "slave_acquisitions": [...]}]
+"""
+import os, logging
+from collections import OrderedDict
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+PAIR_SORT_KEYS = [ "pair_rank", "-urgency", "starttime" ]
+
+
+class PairTracker(object):
+    """Tracks which interferogram pairs still wait on SLCs."""
+
+    def __init__(self, pairs, acq_ids):
+        """
+        :param pairs: list of pair dicts of the ctx "ifg_pairs" setting
+        :param acq_ids: acquisition ids being localized; every pair acquisition must be one of them
+        """
+        self.acq_ids = list(acq_ids)
+        acq_ids = set(acq_ids)
+        self.pairs = OrderedDict()
+        self.outstanding = {}
+        self.pairs_of = {}
+        for i, pair in enumerate(pairs):
+            pair_id = pair.get('id', "ifg-pair_%03d" % i)
+            members = set(pair['master_acquisitions']) | set(pair['slave_acquisitions'])
+            unknown = members - acq_ids
+            if unknown:
+                raise RuntimeError("Acquisitions of pair %s are not in the product list : %s" %(pair_id, ", ".join(sorted(unknown))))
+            self.pairs[pair_id] = pair
+            self.outstanding[pair_id] = members
+            for acq_id in members:
+                self.pairs_of.setdefault(acq_id, []).append(pair_id)
+        self.completed = []
+
+    def set_localized(self, acq_ids):
+        """Mark acquisitions localized. Returns the ids of the pairs this completed."""
+
+        completed = []
+        for acq_id in acq_ids:
+            for pair_id in self.pairs_of.get(acq_id, []):
+                outstanding = self.outstanding[pair_id]
+                if acq_id in outstanding:
+                    outstanding.discard(acq_id)
+                    if len(outstanding) == 0:
+                        completed.append(pair_id)
+        self.completed.extend(completed)
+        return completed
+
+    def urgency(self):
+        """Return dict of acquisition id to the number of pairs still waiting on it."""
+
+        return { acq_id: sum(1 for pair_id in pair_ids if acq_id in self.outstanding[pair_id])
+                 for acq_id, pair_ids in self.pairs_of.items() }
+
+    def ranks(self):
+        """
+        Return dict of acquisition id to the rank of the first incomplete pair it
+        belongs to, the pairs with the fewest outstanding SLCs ranking first.
+        Acquisitions outside any incomplete pair rank last.
+        """
+        incomplete = [ pair_id for pair_id in self.pairs if len(self.outstanding[pair_id]) > 0 ]
+        incomplete.sort(key=lambda pair_id: len(self.outstanding[pair_id]))
+        ranks = {}
+        for rank, pair_id in enumerate(incomplete):
+            for acq_id in self.outstanding[pair_id]:
+                ranks.setdefault(acq_id, rank)
+        for acq_id in self.acq_ids:
+            ranks.setdefault(acq_id, len(incomplete))
+        return ranks
+
+    def schedule_cfg(self, schedule_cfg=None, job_priority=None):
+        """
+        Return schedule settings (see scheduling.schedule) that order acquisitions
+        pair by pair, keeping any sort keys and values of schedule_cfg. Without
+        schedule_cfg, all jobs keep job_priority and only their order changes.
+        """
+        cfg = dict(schedule_cfg or {})
+        if not schedule_cfg and job_priority is not None:
+            cfg['max_job_priority'] = job_priority
+        cfg['pair_rank'] = self.ranks()
+        cfg.setdefault('urgency', self.urgency())
+        cfg.setdefault('sort_keys', PAIR_SORT_KEYS)
+        return cfg
+
+    def order(self, acqs):
+        """Sort acquisition records pair by pair, e.g. before polling their jobs."""
+
+        ranks = self.ranks()
+        return sorted(acqs, key=lambda acq: ranks[acq.acq_id])
+
+    def get_pair_record(self, pair_id):
+        pair = self.pairs[pair_id]
+        return {
+            "type": "pair",
+            "id": pair_id,
+            "master_acquisitions": pair['master_acquisitions'],
+            "slave_acquisitions": pair['slave_acquisitions']
+        }
+
+    def summary(self):
+        return { "total": len(self.pairs), "complete": len(self.completed) }
+
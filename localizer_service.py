@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Long running multi acquisition localizer service.
+
+Instead of a fresh container per localization, the service keeps one process
+with warm acquisition/SLC caches, job templates and Mozart/GRQ lookups, and
+accepts localization requests over a local HTTP API on a TCP port or a Unix
+socket. Each request is answered at once with a handle; a single poller
+thread tracks the sling jobs of every outstanding request with one batched
+job status lookup per poll.
+
+API:
+  POST /localize          body like the job context : {"products": [...],
+                          "asf_ngap_download_queue": ..., "esa_download_queue": ...,
+                          "job_priority": ..., optionally "spyddder_sling_extract_version",
+                          "schedule", "ifg_pairs"}  -> 202 {"handle": ...}
+  GET  /localize/<handle> state, summary and localized data of a request
+  GET  /status            number of requests per state
+"""
+from builtins import str
+import os, sys, json, time, uuid, logging, argparse, threading, traceback, socket
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+import acquisition_localizer_multi as multi
+import localizer_util
+import sling_lease
+import slc_snapshot
+import queue_routing
+import ifg_pairs
+from acquisition_localizer_multi import AcqTracker
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+DEFAULT_PORT = 8765
+# finished requests are kept this long for their clients to collect
+REQUEST_TTL = 86400
+
+SUBMITTING = "submitting"  # looking up acquisitions and submitting sling jobs
+WAITING = "waiting"        # waiting for sling jobs
+DONE = "done"              # all SLCs localized
+FAILED = "failed"
+
+
+class LocalizationRequest(object):
+    """One localization request and the localization state of its acquisitions."""
+
+    def __init__(self, ctx):
+        self.handle = str(uuid.uuid4())
+        self.ctx = ctx
+        self.state = SUBMITTING
+        self.error = None
+        self.tracker = None
+        self.pairs = None
+        self.localized_data = {}
+        self.created = time.time()
+        self.deadline = None
+        self.finished = None
+
+    def finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.finished = time.time()
+        logger.info("Request %s %s%s" %(self.handle, state, " : %s" %error if error else ""))
+
+    def to_dict(self):
+        result = {
+            "handle": self.handle,
+            "state": self.state,
+            "error": self.error,
+            "summary": self.tracker.summary() if self.tracker else None,
+            "localized_data": self.localized_data
+        }
+        if self.pairs is not None:
+            result["pairs"] = self.pairs.summary()
+            result["completed_pairs"] = [ self.pairs.get_pair_record(pair_id) for pair_id in self.pairs.completed ]
+        return result
+
+
+class LocalizerService(object):
+    """Accepts localization requests and polls the sling jobs of all of them in one loop."""
+
+    def __init__(self, lease_store=None, router=None, poll_interval=None):
+        # overlapping requests for the same SLCs are coalesced through the worker's leases by default
+        self.lease_store = lease_store if lease_store is not None else sling_lease.get_lease_store("local")
+        self.router = router
+        self.poll_interval = poll_interval or multi.sleep_seconds
+        self.requests = {}
+        # guards self.requests and the trackers of waiting requests
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.poller = threading.Thread(target=self.poll_loop, name="poller")
+        self.poller.daemon = True
+
+    def start(self):
+        self.poller.start()
+        if not os.environ.get("SLC_SNAPSHOT_DISABLE"):
+            # the service outlives a snapshot export, so it keeps the worker's snapshot fresh
+            slc_snapshot.start_refresher(self.stopped)
+
+    def stop(self):
+        self.stopped.set()
+
+    def submit(self, ctx):
+        """Start localizing the products of ctx and return the request handle."""
+
+        for key in ('products', 'asf_ngap_download_queue', 'esa_download_queue', 'job_priority'):
+            if key not in ctx:
+                raise ValueError("Missing %s" %key)
+        request = LocalizationRequest(ctx)
+        with self.lock:
+            self.requests[request.handle] = request
+        thread = threading.Thread(target=self.start_request, args=(request,), name=request.handle)
+        thread.daemon = True
+        thread.start()
+        return request.handle
+
+    def get(self, handle):
+        with self.lock:
+            request = self.requests.get(handle)
+            return request.to_dict() if request else None
+
+    def status(self):
+        with self.lock:
+            counts = {}
+            for request in self.requests.values():
+                counts[request.state] = counts.get(request.state, 0) + 1
+            return counts
+
+    def start_request(self, request):
+        """Look up the acquisitions of request and submit their sling jobs."""
+
+        ctx = request.ctx
+        try:
+            acq_list = ctx['products'] if isinstance(ctx['products'], list) else [ctx['products']]
+            acq_info = multi.get_acq_data_from_list(acq_list)
+            tracker = AcqTracker(acq_info)
+            pairs = ifg_pairs.PairTracker(ctx['ifg_pairs'], acq_info.keys()) if ctx.get('ifg_pairs') else None
+            jobs = multi.submit_pending(tracker, ctx.get('spyddder_sling_extract_version', 'develop'),
+                                       ctx['esa_download_queue'], ctx['asf_ngap_download_queue'], ctx['job_priority'],
+                                       self.lease_store, self.router, ctx.get('schedule'), pairs)
+            localized = tracker.get(AcqTracker.LOCALIZED)
+            localized_data = multi.get_localized_data_batch(localized)
+        except Exception as e:
+            logger.info(traceback.format_exc())
+            with self.lock:
+                request.finish(FAILED, str(e))
+            return
+
+        with self.lock:
+            request.tracker = tracker
+            request.pairs = pairs
+            self.add_localized(request, localized, localized_data)
+            request.deadline = time.time() + max(multi.sling_completion_max_sec, 2000 * jobs)
+            request.state = WAITING
+            logger.info("Request %s : %s sling jobs submitted, %s" %(request.handle, jobs, tracker.summary()))
+        self.check_done(request)
+
+    def add_localized(self, request, acqs, localized_data):
+        """Record the localized data of acqs and the pairs they complete. Called with the lock held."""
+
+        request.localized_data.update(localized_data)
+        if request.pairs is not None:
+            request.pairs.set_localized([ acq.acq_id for acq in acqs ])
+
+    def check_done(self, request):
+        """Finish request once none of its sling jobs is outstanding."""
+
+        with self.lock:
+            if request.state != WAITING or not request.tracker.all_jobs_done():
+                return
+            tracker = request.tracker
+            to_check = tracker.get(AcqTracker.COMPLETED) + tracker.get(AcqTracker.FAILED)
+        # final recheck of the SLCs the localizer job does before giving up on them
+        slc_status = multi.get_slc_status_batch([ acq.identifier for acq in to_check ], retry=True)
+        confirmed = [ acq for acq in to_check if slc_status[acq.identifier] ]
+        localized_data = multi.get_localized_data_batch(confirmed)
+        with self.lock:
+            # the request and poller threads may both get here, only the first one finishes the request
+            if request.state != WAITING:
+                return
+            for acq in to_check:
+                tracker.set_localized(acq, slc_status[acq.identifier])
+            self.add_localized(request, confirmed, localized_data)
+            multi.record_ledger_states(tracker, to_check)
+            not_localized = [ acq_id for acq_id, state in tracker.state_of.items() if state != AcqTracker.LOCALIZED ]
+            if len(not_localized) == 0:
+                request.finish(DONE)
+            else:
+                request.finish(FAILED, "SLCs NOT localized : %s" %", ".join(not_localized))
+        multi.release_leases(self.lease_store, confirmed)
+
+    def poll(self):
+        """Poll the outstanding sling jobs of all waiting requests in one batch."""
+
+        with self.lock:
+            waiting = [ request for request in self.requests.values() if request.state == WAITING ]
+            to_poll = { request.handle: request.tracker.to_poll() for request in waiting }
+        job_ids = set(acq.job_id for acqs in to_poll.values() for acq in acqs)
+        if len(job_ids) == 0:
+            return
+        job_statuses = multi.get_job_status_batch(list(job_ids))
+
+        completed = {}
+        with self.lock:
+            for request in waiting:
+                completed[request.handle] = multi.update_job_statuses(request.tracker, to_poll[request.handle], job_statuses)
+
+        # confirm the SLCs of the jobs that completed, for all requests at once
+        identifiers = set(acq.identifier for acqs in completed.values() for acq in acqs)
+        slc_status = multi.get_slc_status_batch(list(identifiers), retry=True)
+        confirmed = { handle: [ acq for acq in acqs if slc_status[acq.identifier] ] for handle, acqs in completed.items() }
+        localized_data = multi.get_localized_data_batch([ acq for acqs in confirmed.values() for acq in acqs ])
+
+        now = time.time()
+        with self.lock:
+            for request in waiting:
+                if request.state != WAITING:
+                    # finished by check_done meanwhile
+                    continue
+                for acq in completed[request.handle]:
+                    request.tracker.set_localized(acq, slc_status[acq.identifier])
+                self.add_localized(request, confirmed[request.handle],
+                                   { acq.acq_id: localized_data[acq.acq_id] for acq in confirmed[request.handle] })
+                multi.record_ledger_states(request.tracker, to_poll[request.handle])
+                if now > request.deadline and not request.tracker.all_jobs_done():
+                    request.finish(FAILED, "Sling jobs NOT completed after %.2f hours" %((now - request.created) / 3600.))
+        multi.release_leases(self.lease_store, [ acq for acqs in confirmed.values() for acq in acqs ])
+        for request in waiting:
+            self.check_done(request)
+
+    def expire(self):
+        """Forget finished requests after REQUEST_TTL."""
+
+        now = time.time()
+        with self.lock:
+            for handle in [ handle for handle, request in self.requests.items()
+                            if request.finished and now - request.finished > REQUEST_TTL ]:
+                del self.requests[handle]
+
+    def poll_loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+                self.expire()
+            except Exception as e:
+                logger.info("Polling failed, retrying in %s secs : %s\n%s" %(self.poll_interval, str(e), traceback.format_exc()))
+            self.stopped.wait(self.poll_interval)
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != "/localize":
+            return self.send_json(404, { "error": "Unknown path %s" %self.path })
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            ctx = json.loads(self.rfile.read(length).decode('utf-8'))
+            handle = self.server.service.submit(ctx)
+        except (ValueError, TypeError) as e:
+            return self.send_json(400, { "error": str(e) })
+        self.send_json(202, { "handle": handle })
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == "/status":
+            return self.send_json(200, self.server.service.status())
+        if path.startswith("/localize/"):
+            request = self.server.service.get(path[len("/localize/"):])
+            if request is not None:
+                return self.send_json(200, request)
+        self.send_json(404, { "error": "Unknown path %s" %self.path })
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s" %(self.address_string(), format %args))
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        self.server_name = socket.gethostname()
+        self.server_port = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the multi acquisition localizer as a service.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost port to listen on")
+    parser.add_argument("--socket", help="Unix socket to listen on instead of a port")
+    parser.add_argument("--poll-interval", type=int, default=multi.sleep_seconds, help="seconds between job status polls")
+    parser.add_argument("--sling-lease-store", choices=["es", "local"], default="local",
+                        help="coalesce sling requests across the worker (local, default) or with other workers (es)")
+    parser.add_argument("--queue-routing", choices=queue_routing.POLICIES, help="download queue routing policy")
+    args = parser.parse_args()
+
+    lease_store = sling_lease.get_lease_store(args.sling_lease_store, localizer_util.get_conf('JOBS_ES_URL'))
+    router = queue_routing.get_queue_router({ "policy": args.queue_routing } if args.queue_routing else None, localizer_util.get_conf('JOBS_ES_URL'))
+    service = LocalizerService(lease_store, router, args.poll_interval)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, ServiceRequestHandler)
+        logger.info("Listening on %s" %args.socket)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), ServiceRequestHandler)
+        logger.info("Listening on 127.0.0.1:%s" %args.port)
+    server.service = service
+    service.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+#!/bin/bash
+set -e
+
+BASE_PATH=$(dirname "${BASH_SOURCE}")
+BASE_PATH=$(cd "${BASE_PATH}"; pwd)
+
+# source PGE env
+export PYTHONPATH=$BASE_PATH:$PYTHONPATH
+export PYTHONPATH=${PYTHONPATH}:${HOME}/verdi/etc 
+export PATH=$BASE_PATH:$PATH
+
+# source environment
+source $HOME/verdi/bin/activate
+
+echo -n "Starting localizer_service.py $@: " 1>&2
+date 1>&2
+exec python $BASE_PATH/localizer_service.py "$@"
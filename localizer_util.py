@@ -1,138 +1,127 @@
 #!/usr/bin/env python 
-import os, sys, time, json, requests, logging
-from hysds_commons.job_utils import resolve_hysds_job
-from hysds.celery import app
-import datetime
-import dateutil.parser
-from datetime import datetime, timedelta
-
-GRQ_URL = app.conf.GRQ_ES_URL
-
-
-def get_dataset(id, index_suffix):
-    """Query for existence of dataset by ID."""
-
-    # es_url and es_index
-    es_url = GRQ_URL
-    es_index = "grq_*_{}".format(index_suffix.lower())
-    #es_index = "grq"
-
-    # query
-    query = {
-        "query":{
-            "bool":{
-                "must":[
-                    { "term":{ "_id": id } }
-                ]
-            }
-        },
-        "fields": []
-    }
-
-    print(query)
-
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+import os, re, time, json, requests
 
-    if r.status_code != 200:
-        print("Failed to query %s:\n%s" % (es_url, r.text))
-        print("query: %s" % json.dumps(query, indent=2))
-        print("returned: %s" % r.text)
-        r.raise_for_status()
 
-    result = r.json()
-    print(result['hits']['total'])
-    return result
-
-def get_dataset(id):
-    """Query for existence of dataset by ID."""
-
-    # es_url and es_index
-    es_url = GRQ_URL
-    #es_index = "grq_*_{}".format(index_suffix.lower())
-    es_index = "grq"
-
-    # query
-    query = {
-        "query":{
-            "bool":{
-                "must":[
-                    { "term":{ "_id": id } }
-                ]
-            }
-        },
-        "fields": []
-    }
-
-    print(query)
-
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+SLC_INDEX_SUFFIX = "S1-IW_SLC"
+ACQ_INDEX = "grq_*_*acquisition*"
+MGET_BATCH_SIZE = 500
+# hits per ID to allow for when searching an unresolved index pattern, which may hold several versions of a doc
+MAX_INDEX_VERSIONS = 10
+# resolved indices are looked up again after this long, so long running processes see new dataset versions
+INDEX_RESOLVE_TTL = 600
+HTTP_POOL_SIZE = 16
 
-    if r.status_code != 200:
-        print("Failed to query %s:\n%s" % (es_url, r.text))
-        print("query: %s" % json.dumps(query, indent=2))
-        print("returned: %s" % r.text)
-        r.raise_for_status()
+# index pattern -> tuple(comma separated concrete indices, time resolved)
+_resolved_indices = {}
+# (pid, session) of the HTTP session shared by the lookups of this process
+_session = (None, None)
 
-    result = r.json()
-    print(result['hits']['total'])
-    return result
-
-
-def get_partial_grq_data(id):
-    es_url = GRQ_URL
-    es_index = "grq"
-
-    query = {
-        "query": {
-            "term": {
-                "_id": id,
-            },
-        },
-        "partial_fields" : {
-            "partial" : {
-                "exclude" : "city",
-            }
-        }
-    }
 
-    print(query)
+def get_app():
+    """Return the HySDS celery app. Importing it loads the celery config, which
+       takes seconds, so it is only done once a module actually needs it."""
 
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+    from hysds.celery import app
+    return app
 
-    if r.status_code != 200:
-        print("Failed to query %s:\n%s" % (es_url, r.text))
-        print("query: %s" % json.dumps(query, indent=2))
-        print("returned: %s" % r.text)
-        r.raise_for_status()
 
-    result = r.json()
-    print(result['hits']['total'])
-    return result['hits']['hits'][0]
+def get_conf(key):
+    """Return a setting of the HySDS celery config, e.g. MOZART_URL or JOBS_ES_URL."""
+
+    return get_app().conf[key]
+
+
+def get_grq_url():
+    return get_conf('GRQ_ES_URL')
+
+
+def get_session():
+    """Return the requests session shared by the ES lookups of this process, so they
+       reuse pooled connections. Forked processes get their own."""
+
+    global _session
+    pid, session = _session
+    if pid != os.getpid():
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = (os.getpid(), session)
+    return session
+
+
+def get_index(index_suffix):
+    """Return the GRQ index pattern for a dataset index suffix."""
+
+    return "grq_*_{}".format(index_suffix.lower())
 
 
-def get_query_data(query):
-    es_url = GRQ_URL
-    es_index = "grq"
+def resolve_index(es_index, es_url=None):
+    """Resolve an index pattern to its concrete indices so that queries only
+       fan out to the shards holding that dataset. Resolutions are cached for
+       INDEX_RESOLVE_TTL; on failure the pattern itself is used."""
 
-    print(query)
+    if es_url is None: es_url = get_grq_url()
+    key = (es_url, es_index)
+    if key in _resolved_indices and time.time() - _resolved_indices[key][1] < INDEX_RESOLVE_TTL:
+        return _resolved_indices[key][0]
 
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    r = get_session().get('%s/%s/_aliases' % (rest_url, es_index))
+    if r.status_code == 200 and len(r.json()) > 0:
+        resolved = ",".join(sorted(r.json().keys(), reverse=True))
     else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+        print("Failed to resolve index %s, using it as is : %s" % (es_index, r.text))
+        resolved = es_index
+    _resolved_indices[key] = (resolved, time.time())
+    return resolved
+
+
+def mget_docs(ids, es_index, es_url=None, source=None):
+    """Get docs by ID from the concrete indices behind es_index, in batches of
+       MGET_BATCH_SIZE. Returns dict of ID to hit for the IDs found. source
+       optionally lists the _source fields to return."""
+
+    ids = list(ids)
+    docs = {}
+    for i in range(0, len(ids), MGET_BATCH_SIZE):
+        docs.update(_mget_docs(ids[i:i+MGET_BATCH_SIZE], es_index, es_url, source))
+    return docs
+
+
+def index_version(index):
+    """Sort key of a concrete index by its version, e.g. grq_v10.0_... after grq_v9.1_..."""
+
+    return [ int(part) if part.isdigit() else part for part in re.split(r'(\d+)', index) ]
+
+
+def _mget_docs(ids, es_index, es_url=None, source=None):
+    if es_url is None: es_url = get_grq_url()
+    if len(ids) == 0: return {}
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    index = resolve_index(es_index, es_url)
+
+    if "*" not in index:
+        # concrete indices: realtime multi-get of every ID from each of them
+        indices = index.split(",")
+        if len(indices) == 1:
+            url = '%s/%s/_mget' % (rest_url, index)
+            query = { "ids": list(ids) }
+        else:
+            url = '%s/_mget' % rest_url
+            query = { "docs": [ { "_index": i, "_id": id } for i in indices for id in ids ] }
+        if source is not None:
+            url += '?_source=%s' % (",".join(source) if source else "false")
+    else:
+        # unresolved pattern: the same ID may be found in several versioned indices
+        url = '%s/%s/_search' % (rest_url, index)
+        query = {
+            "query": { "ids": { "values": list(ids) } },
+            "size": len(ids) * MAX_INDEX_VERSIONS
+        }
+        if source is not None:
+            query['_source'] = source if source else False
+    r = get_session().post(url, data=json.dumps(query))
 
     if r.status_code != 200:
         print("Failed to query %s:\n%s" % (es_url, r.text))
@@ -141,47 +130,35 @@ def get_query_data(query):
         r.raise_for_status()
 
     result = r.json()
-    print(result['hits']['total'])
-    return result['hits']
-
-
-def get_acquisition_data(id):
-    es_url = GRQ_URL
-    es_index = "grq_*_*acquisition*"
-    query = {
-      "query": {
-        "bool": {
-          "must": [
-            {
-              "term": {
-                "_id": id
-              }
-            }
-          ]
-        }
-      },
-      "partial_fields": {
-        "partial": {
-          "include": [
-            "id",
-            "dataset_type",
-            "dataset",
-            "metadata",
-            "city",
-            "continent"
-          ]
-        }
-      }
-    }
+    hits = result['docs'] if 'docs' in result else result['hits']['hits']
+    docs = {}
+    for hit in hits:
+        # multi-get docs of a missing index come back with an error instead of found
+        if not hit.get('found', True) or 'error' in hit: continue
+        # keep the hit of the newest index version per ID
+        if hit['_id'] not in docs or index_version(hit['_index']) > index_version(docs[hit['_id']]['_index']):
+            docs[hit['_id']] = hit
+    return docs
+
+
+def refresh_index(es_index, es_url=None):
+    """Force a refresh of the concrete indices behind es_index so that
+       recently indexed docs become searchable."""
+
+    if es_url is None: es_url = get_grq_url()
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    r = get_session().post('%s/%s/_refresh' % (rest_url, resolve_index(es_index, es_url)))
+    if r.status_code != 200:
+        print("Failed to refresh %s : %s" % (es_index, r.text))
 
 
-    print(query)
+def iter_scan_pages(query, es_index, size=1000, scroll="5m"):
+    """Yield pages of hits matching query using a scan/scroll search."""
 
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
+    es_url = get_grq_url()
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    url = "{}/{}/_search?search_type=scan&scroll={}&size={}".format(rest_url, es_index, scroll, size)
+    r = get_session().post(url, data=json.dumps(query))
 
     if r.status_code != 200:
         print("Failed to query %s:\n%s" % (es_url, r.text))
@@ -189,8 +166,11 @@ def get_acquisition_data(id):
         print("returned: %s" % r.text)
         r.raise_for_status()
 
-    result = r.json()
-    print(result['hits']['total'])
-    return result['hits']['hits']
-
-
+    scroll_id = r.json()['_scroll_id']
+    while True:
+        r = get_session().post('%s/_search/scroll?scroll=%s' % (rest_url, scroll), data=scroll_id)
+        r.raise_for_status()
+        res = r.json()
+        if len(res['hits']['hits']) == 0: break
+        scroll_id = res['_scroll_id']
+        yield res['hits']['hits']
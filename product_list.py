@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Product lists read from a file instead of inlined in the job context.
+
+The file lists one acquisition id per line, as plain text or as NDJSON where
+each line is a JSON string or an object with an "id" field. It may be gzip,
+bzip2 or xz compressed. Lines are read lazily and handed out in bounded
+batches, so the list is never held in memory as a whole.
+"""
+import os, io, bz2, gzip, json, lzma, logging
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+PRODUCT_BATCH_SIZE = 1000
+
+OPENERS = { ".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open }
+
+
+def get_products_path(products_file, ctx_file):
+    """Return the path of products_file; relative paths are relative to the context file."""
+
+    return os.path.join(os.path.dirname(os.path.abspath(ctx_file)), products_file)
+
+
+def parse_line(line):
+    """Return the acquisition id of a product list line, or None for blank and comment lines."""
+
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line[0] in '{"':
+        record = json.loads(line)
+        return record["id"] if isinstance(record, dict) else record
+    return line
+
+
+def iter_products(path):
+    """Yield the acquisition ids of the product list file at path."""
+
+    opener = OPENERS.get(os.path.splitext(path)[1].lower(), io.open)
+    logger.info("Reading product list %s" %path)
+    with opener(path, "rt") as f:
+        for line in f:
+            product = parse_line(line)
+            if product is not None:
+                yield product
+
+
+def batches(products, size=PRODUCT_BATCH_SIZE):
+    """Yield successive lists of at most size products from any iterable."""
+
+    batch = []
+    for product in products:
+        batch.append(product)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
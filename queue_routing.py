@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Backlog-aware routing of sling jobs between the ASF and ESA download queues.
+
+resolve_s1_slc sends every SLC that ASF serves to the ASF queue. With the
+"balanced" policy, a QueueRouter reads the current backlog (queued jobs) and
+worker count (nodes running jobs) of both queues from Mozart and spills SLCs
+to the ESA queue while the ASF workers are saturated and the ESA queue is
+comparatively idle. Each routing decision is added to the backlog it read, so
+one batch of submissions doesn't all pile onto the same queue.
+"""
+import os, json, time, logging
+import localizer_util
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+ASF_FIRST = "asf_first"
+BALANCED = "balanced"
+POLICIES = (ASF_FIRST, BALANCED)
+
+# defaults of the "balanced" policy
+MAX_BACKLOG_PER_WORKER = 2.0
+SPILL_RATIO = 0.5
+STATS_MAX_AGE = 300
+
+
+def get_queue_stats(es_url, queues):
+    """
+    Aggregate job_status-current for the queued and running jobs of queues.
+    :return: dict of queue to {"queued": n, "running": n, "workers": n}
+    """
+    query = {
+        "size": 0,
+        "query": {
+            "bool": {
+                "must": [
+                    { "terms": { "job.job_info.job_queue": list(queues) } },
+                    { "terms": { "status": [ "job-queued", "job-started" ] } }
+                ]
+            }
+        },
+        "aggs": {
+            "queues": {
+                "terms": { "field": "job.job_info.job_queue", "size": len(queues) },
+                "aggs": {
+                    "queued": { "filter": { "term": { "status": "job-queued" } } },
+                    "running": {
+                        "filter": { "term": { "status": "job-started" } },
+                        "aggs": { "workers": { "cardinality": { "field": "job.job_info.execute_node" } } }
+                    }
+                }
+            }
+        }
+    }
+    rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+    r = localizer_util.get_session().post('%s/job_status-current/_search' % rest_url, data=json.dumps(query))
+    if r.status_code != 200:
+        print("Failed to query %s:\n%s" % (es_url, r.text))
+        print("query: %s" % json.dumps(query, indent=2))
+        print("returned: %s" % r.text)
+        r.raise_for_status()
+
+    stats = { queue: { "queued": 0, "running": 0, "workers": 0 } for queue in queues }
+    for bucket in r.json()['aggregations']['queues']['buckets']:
+        stats[bucket['key']] = {
+            "queued": bucket['queued']['doc_count'],
+            "running": bucket['running']['doc_count'],
+            "workers": bucket['running']['workers']['value']
+        }
+    return stats
+
+
+class QueueRouter(object):
+    """Chooses between the ASF and ESA queue for SLCs that ASF can serve."""
+
+    def __init__(self, get_stats, policy=BALANCED, max_backlog_per_worker=MAX_BACKLOG_PER_WORKER,
+                 spill_ratio=SPILL_RATIO, stats_max_age=STATS_MAX_AGE):
+        """
+        :param get_stats: function(queues) returning the stats of get_queue_stats;
+                          lets a broker stand-in replace Mozart
+        :param max_backlog_per_worker: ASF backlog per worker above which SLCs may be spilled
+        :param spill_ratio: spill only while the ESA backlog per worker is below
+                            this fraction of the ASF one
+        """
+        if policy not in POLICIES:
+            raise RuntimeError("Unknown queue routing policy : %s" % policy)
+        self.get_stats = get_stats
+        self.policy = policy
+        self.max_backlog_per_worker = max_backlog_per_worker
+        self.spill_ratio = spill_ratio
+        self.stats_max_age = stats_max_age
+        self.stats = None
+        self.stats_time = None
+
+    def _refresh(self, queues):
+        if self.stats is None or time.time() - self.stats_time > self.stats_max_age or \
+           any(queue not in self.stats for queue in queues):
+            try:
+                self.stats = self.get_stats(queues)
+            except Exception as e:
+                # routing falls back to ASF first rather than failing the localizer
+                logger.warning("Failed to get queue stats, not spilling : %s" % str(e))
+                self.stats = { queue: { "queued": 0, "running": 0, "workers": 0 } for queue in queues }
+            self.stats_time = time.time()
+            logger.info("Queue stats : %s" % json.dumps(self.stats))
+
+    def backlog_per_worker(self, queue):
+        stats = self.stats[queue]
+        return stats['queued'] / float(max(stats['workers'], 1))
+
+    def route(self, asf_queue, esa_queue):
+        """Return the queue to sling an SLC that ASF serves through, and count it against that queue."""
+
+        if self.policy == ASF_FIRST:
+            return asf_queue
+        self._refresh([asf_queue, esa_queue])
+        asf_load = self.backlog_per_worker(asf_queue)
+        esa_load = self.backlog_per_worker(esa_queue)
+        queue = asf_queue
+        if asf_load > self.max_backlog_per_worker and esa_load < asf_load * self.spill_ratio:
+            queue = esa_queue
+        self.record(queue)
+        return queue
+
+    def record(self, queue):
+        """Count a job routed to queue against its backlog."""
+
+        if self.stats is not None and queue in self.stats:
+            self.stats[queue]['queued'] += 1
+
+
+def get_queue_router(routing, es_url):
+    """
+    Return a QueueRouter for the routing settings of the context, e.g.
+    {"policy": "balanced", "max_backlog_per_worker": 2, "spill_ratio": 0.5},
+    or None for the default ASF first routing.
+    """
+    if not routing or routing.get('policy', ASF_FIRST) == ASF_FIRST:
+        return None
+    return QueueRouter(lambda queues: get_queue_stats(es_url, queues),
+                       policy=routing['policy'],
+                       max_backlog_per_worker=routing.get('max_backlog_per_worker', MAX_BACKLOG_PER_WORKER),
+                       spill_ratio=routing.get('spill_ratio', SPILL_RATIO),
+                       stats_max_age=routing.get('stats_max_age', STATS_MAX_AGE))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Ordering and prioritization of sling job submissions.
+
+Acquisitions are sorted by a configurable list of keys and the resulting rank
+is mapped onto a range of job priorities, so the acquisitions that matter most
+downstream are submitted first and picked up first by the sling workers.
+
+Sort keys are "starttime" (acquisition sensing start) or the name of a per
+acquisition value supplied with the schedule, e.g. "aoi_priority" or
+"urgency" (the number of interferogram pairs an acquisition unblocks). A key
+prefixed with "-" sorts descending.
+"""
+import os, logging
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+DEFAULT_SORT_KEYS = [ "-urgency", "-aoi_priority", "starttime" ]
+MAX_JOB_PRIORITY = 9
+
+
+def get_sort_value(acq, key, values):
+    if key == "starttime":
+        return acq.starttime or ""
+    return values.get(key, {}).get(acq.acq_id, 0)
+
+
+def order_acquisitions(acqs, sort_keys=DEFAULT_SORT_KEYS, values=None):
+    """
+    Return acqs sorted by sort_keys, most important first.
+    :param acqs: list of acquisition records
+    :param values: dict of key name to dict of acquisition id to value
+    """
+    if values is None: values = {}
+    ordered = list(acqs)
+    # successive stable sorts, least significant key first
+    for key in reversed(sort_keys):
+        reverse = key.startswith("-")
+        key = key.lstrip("-")
+        ordered.sort(key=lambda acq: get_sort_value(acq, key, values), reverse=reverse)
+    return ordered
+
+
+def assign_priorities(ordered_acqs, base_priority, max_priority=MAX_JOB_PRIORITY):
+    """
+    Map the rank of ordered acquisitions onto job priorities from max_priority
+    (first) down to base_priority (last), in equal sized bands.
+    :return: dict of acquisition id to job priority
+    """
+    base_priority = int(base_priority)
+    max_priority = max(int(max_priority), base_priority)
+    levels = max_priority - base_priority + 1
+    count = len(ordered_acqs)
+    return { acq.acq_id: max_priority - (rank * levels // count)
+             for rank, acq in enumerate(ordered_acqs) }
+
+
+def schedule(acqs, base_priority, schedule_cfg):
+    """
+    Order acqs and assign their job priorities according to the schedule settings
+    of the context, e.g.
+    {"sort_keys": ["-urgency", "starttime"], "max_job_priority": 7,
+     "aoi_priority": {"<acq_id>": 5}, "urgency": {"<acq_id>": 3}}
+    Without settings, acqs keep their order and all get base_priority.
+    :return: tuple(ordered acqs, dict of acquisition id to job priority)
+    """
+    if not schedule_cfg:
+        return list(acqs), { acq.acq_id: base_priority for acq in acqs }
+    if len(acqs) == 0:
+        return [], {}
+    values = { key: value for key, value in schedule_cfg.items() if isinstance(value, dict) }
+    ordered = order_acquisitions(acqs, schedule_cfg.get('sort_keys', DEFAULT_SORT_KEYS), values)
+    priorities = assign_priorities(ordered, base_priority, schedule_cfg.get('max_job_priority', MAX_JOB_PRIORITY))
+    logger.info("Scheduled %s acquisitions, first : %s (priority %s), last : %s (priority %s)" %(len(ordered),
+                ordered[0].acq_id, priorities[ordered[0].acq_id], ordered[-1].acq_id, priorities[ordered[-1].acq_id]))
+    return ordered, priorities
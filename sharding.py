@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Partitioning and checkpointing for the sharded multi acquisition localizer.
+
+A large product list is split into shards that are localized by separate
+processes, each in its own directory. Acquisitions of the same interferogram
+pair always land in the same shard, so pairs are still reported as units.
+Every shard records the sling jobs it submitted in a checkpoint, so a shard
+that is rerun attaches to its earlier jobs instead of submitting them again.
+"""
+import os, json, logging
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+SHARD_DIR_TMPL = "shard_%03d"
+CHECKPOINT_FILE = "sling_checkpoint.ndjson"
+
+
+def group_acquisitions(acq_list, pair_list=None):
+    """Return lists of acquisitions that must be localized together: the ones linked by pairs."""
+
+    parent = { acq_id: acq_id for acq_id in acq_list }
+
+    def find(acq_id):
+        while parent[acq_id] != acq_id:
+            parent[acq_id] = parent[parent[acq_id]]
+            acq_id = parent[acq_id]
+        return acq_id
+
+    for pair in pair_list or []:
+        members = [ acq_id for acq_id in pair['master_acquisitions'] + pair['slave_acquisitions'] if acq_id in parent ]
+        for acq_id in members[1:]:
+            parent[find(acq_id)] = find(members[0])
+
+    groups = {}
+    for acq_id in acq_list:
+        groups.setdefault(find(acq_id), []).append(acq_id)
+    return list(groups.values())
+
+
+def partition(acq_list, shards, pair_list=None):
+    """
+    Split acq_list into at most shards balanced lists, keeping paired acquisitions together.
+    :return: list of tuple(acquisition ids, pairs whose acquisitions are all in the shard)
+    """
+    groups = sorted(group_acquisitions(acq_list, pair_list), key=len, reverse=True)
+    parts = [ [] for i in range(min(shards, len(groups))) ]
+    # largest groups first, each to the least loaded shard
+    for group in groups:
+        min(parts, key=len).extend(group)
+
+    position = { acq_id: i for i, acq_id in enumerate(acq_list) }
+    result = []
+    for part in parts:
+        part.sort(key=position.get)
+        members = set(part)
+        pairs = [ pair for pair in pair_list or [] if (pair['master_acquisitions'] + pair['slave_acquisitions'])[0] in members ]
+        result.append((part, pairs))
+    return result
+
+
+class SlingCheckpoint(object):
+    """Append-only record of the sling job submitted for each acquisition of a shard."""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+
+    def load(self):
+        """Return dict of acquisition id to the last sling job id recorded for it."""
+
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path) as f:
+            for line in f:
+                try: record = json.loads(line)
+                except ValueError: continue  # partial last line of a killed shard
+                jobs[record['acquisition']] = record['job_id']
+        logger.info("Loaded %s sling jobs from checkpoint %s" %(len(jobs), self.path))
+        return jobs
+
+    def record(self, acq_jobs):
+        """Record list of tuple(acquisition id, job id)."""
+
+        with open(self.path, 'a') as f:
+            for acq_id, job_id in acq_jobs:
+                f.write(json.dumps({ "acquisition": acq_id, "job_id": job_id }) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
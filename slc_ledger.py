@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Worker-local ledger of SLC localizations that outlives localizer runs.
+
+For each SLC identifier the ledger keeps when its sling job was requested, the
+job id, the queue and url type it was routed to, how long the job took and the
+last known state. Localizers consult it to skip SLCs already known to be
+localized and to reattach to sling jobs still in flight from earlier runs, and
+the planner uses the recorded durations to predict sling times.
+
+Like the acquisition cache, the ledger is a SQLite file in the worker's shared
+cache directory, and it never fails a localizer job: errors just disable it.
+"""
+import os, time, sqlite3, logging
+from acq_cache import get_cache_dir, chunks
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+SLC_LEDGER_FILE_NAME = "slc_ledger.sqlite"
+SQLITE_TIMEOUT = 60
+SQLITE_MAX_VARS = 500
+
+# states recorded for an SLC; the AcqTracker states of its acquisition
+SUBMITTED = "submitted"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+LOCALIZED = "localized"
+IN_FLIGHT = (SUBMITTED, RUNNING)
+
+COLUMNS = ("identifier", "acq_id", "requested", "job_id", "queue", "url_type", "state", "duration", "updated")
+
+
+class SlcLedger(object):
+    """On-disk, process-safe ledger of SLC sling requests and their outcome."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), SLC_LEDGER_FILE_NAME)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS slc_ledger (
+                              identifier TEXT PRIMARY KEY,
+                              acq_id TEXT,
+                              requested REAL,
+                              job_id TEXT,
+                              queue TEXT,
+                              url_type TEXT,
+                              state TEXT NOT NULL,
+                              duration REAL,
+                              updated REAL NOT NULL)""")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, identifiers):
+        """Return dict of SLC identifier to its ledger entry, for the identifiers in the ledger."""
+
+        entries = {}
+        try:
+            with self._connect() as conn:
+                for batch in chunks(set(identifiers), SQLITE_MAX_VARS):
+                    rows = conn.execute("SELECT %s FROM slc_ledger WHERE identifier IN (%s)" %
+                                        (", ".join(COLUMNS), ",".join("?" * len(batch))), batch).fetchall()
+                    for row in rows:
+                        entries[row[0]] = dict(zip(COLUMNS, row))
+        except sqlite3.Error as e:
+            logger.warning("Failed to read SLC ledger %s : %s" % (self.path, str(e)))
+        return entries
+
+    def record_requested(self, requests):
+        """
+        Record newly submitted sling jobs.
+        :param requests: list of tuple(identifier, acq_id, job_id, queue, url_type)
+        """
+        if not requests: return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany("""INSERT OR REPLACE INTO slc_ledger (identifier, acq_id, requested, job_id, queue, url_type, state, duration, updated)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)""",
+                                 [ (identifier, acq_id, now, job_id, queue, url_type, SUBMITTED, now)
+                                   for identifier, acq_id, job_id, queue, url_type in requests ])
+        except sqlite3.Error as e:
+            logger.warning("Failed to update SLC ledger %s : %s" % (self.path, str(e)))
+
+    def record_states(self, states):
+        """
+        Record the current state of SLCs, and how long their sling job took once it is done.
+        :param states: list of tuple(identifier, acq_id, state, completed) where completed is the
+                       epoch time the SLC's sling job ended, or None if it is not done or not known
+        """
+        if not states: return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO slc_ledger (identifier, acq_id, state, updated) VALUES (?, ?, ?, ?)",
+                                 [ (identifier, acq_id, state, now) for identifier, acq_id, state, completed in states ])
+                # a job that seems to end before it was requested (clock skew between Mozart and
+                # the worker) gives no usable duration
+                conn.executemany("""UPDATE slc_ledger SET state = ?, updated = ?,
+                                      duration = CASE WHEN ? >= requested AND duration IS NULL
+                                                      THEN ? - requested ELSE duration END
+                                    WHERE identifier = ?""",
+                                 [ (state, now, completed, completed, identifier)
+                                   for identifier, acq_id, state, completed in states ])
+        except sqlite3.Error as e:
+            logger.warning("Failed to update SLC ledger %s : %s" % (self.path, str(e)))
+
+    def duration_stats(self, since=None):
+        """
+        Return the sling durations recorded per url type, e.g.
+        {"asf": {"count": 120, "mean_sec": 900.0, "max_sec": 2400.0}}
+        :param since: only count jobs requested after this epoch time
+        """
+        stats = {}
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("""SELECT url_type, COUNT(*), AVG(duration), MAX(duration) FROM slc_ledger
+                                       WHERE duration IS NOT NULL AND url_type IS NOT NULL AND requested >= ?
+                                       GROUP BY url_type""", (since or 0,)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Failed to read SLC ledger %s : %s" % (self.path, str(e)))
+            return stats
+        for url_type, count, mean_sec, max_sec in rows:
+            stats[url_type] = { "count": count, "mean_sec": mean_sec, "max_sec": max_sec }
+        return stats
+
+
+_slc_ledger = None
+
+
+def get_slc_ledger():
+    """Return the worker's SLC ledger, or None if it is disabled or unusable."""
+
+    global _slc_ledger
+    if os.environ.get("SLC_LEDGER_DISABLE"): return None
+    if _slc_ledger is None:
+        try: _slc_ledger = SlcLedger()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("SLC ledger unavailable, continuing without it : %s" % str(e))
+            _slc_ledger = False
+    return _slc_ledger or None
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Local snapshot of the SLC identifiers already ingested into GRQ.
+
+The snapshot is a file of sorted, fixed width ID records exported in bulk from
+the SLC index and shared by all localizer jobs on the worker. Lookups binary
+search the memory mapped file, so the IDs live once in the page cache instead
+of in every (forked) localizer process.
+
+Exporting scans the whole SLC index, so localizer jobs never do it: run this
+module (e.g. from cron) to refresh the snapshot out of band, or let the long
+running localizer service refresh it with start_refresher. Jobs just load
+whatever snapshot exists and check ES for the rest. Only one process exports
+at a time.
+
+SLCs are not removed from GRQ once localized, so a hit in the snapshot, even a
+stale one, is treated as authoritative. A miss only means the SLC was not
+ingested when the snapshot was taken and must be confirmed against ES.
+"""
+import os, sys, mmap, time, fcntl, struct, logging, threading
+
+import localizer_util
+from acq_cache import get_cache_dir
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+SLC_INDEX = "grq_*_s1-iw_slc"
+SLC_SNAPSHOT_FILE_NAME = "slc_ids.snapshot"
+SLC_SNAPSHOT_MAX_AGE = int(os.environ.get("SLC_SNAPSHOT_MAX_AGE", 6 * 3600))
+
+# header: magic, record width, record count
+HEADER = struct.Struct("<8sII")
+MAGIC = b"SLCIDS01"
+
+
+class SlcSnapshot(object):
+    """Sorted fixed width records of ingested SLC IDs, memory mapped from a file on disk."""
+
+    def __init__(self, path=None, max_age=SLC_SNAPSHOT_MAX_AGE, es_index=SLC_INDEX):
+        self.path = path or os.path.join(get_cache_dir(), SLC_SNAPSHOT_FILE_NAME)
+        self.max_age = max_age
+        self.es_index = es_index
+        # tuple(mmap, record width, record count), swapped as a whole on reload
+        self.view = None
+        self.loaded_mtime = None
+
+    def __contains__(self, slc_id):
+        if self.view is None: return False
+        records, width, count = self.view
+        key = slc_id.encode('utf-8')
+        if count == 0 or len(key) > width: return False
+        key = key.ljust(width)
+
+        def record(i):
+            start = HEADER.size + i * width
+            return records[start:start + width]
+
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if record(mid) < key: lo = mid + 1
+            else: hi = mid
+        return lo < count and record(lo) == key
+
+    def __len__(self):
+        return self.view[2] if self.view else 0
+
+    def age(self):
+        """Seconds since the snapshot file was written, None if there is none."""
+
+        if not os.path.exists(self.path): return None
+        return time.time() - os.path.getmtime(self.path)
+
+    def is_stale(self):
+        age = self.age()
+        return age is None or age > self.max_age
+
+    def load(self):
+        """(Re)map the snapshot file if it changed since it was last loaded."""
+
+        if not os.path.exists(self.path): return
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.loaded_mtime: return
+        with open(self.path, 'rb') as f:
+            new_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, width, count = HEADER.unpack(new_map[:HEADER.size])
+        if magic != MAGIC or len(new_map) != HEADER.size + width * count:
+            new_map.close()
+            raise RuntimeError("Invalid SLC snapshot %s" % self.path)
+        # the previous map is unmapped once no lookup uses it any more
+        self.view = (new_map, width, count)
+        self.loaded_mtime = mtime
+        logger.info("Loaded %s SLC ids from snapshot %s" % (count, self.path))
+
+    def export(self):
+        """Export all SLC IDs from ES into the snapshot file."""
+
+        query = {
+            "query": { "match_all": {} },
+            "fields": []
+        }
+        start = time.time()
+        ids = set()
+        for hits in localizer_util.iter_scan_pages(query, self.es_index):
+            ids.update(hit['_id'].encode('utf-8') for hit in hits)
+        width = max([ len(i) for i in ids ] or [0])
+        records = sorted(i.ljust(width) for i in ids)
+        tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, width, len(records)))
+            f.write(b"".join(records))
+        os.rename(tmp_path, self.path)
+        logger.info("Exported %s SLC ids to %s in %.1f secs" % (len(records), self.path, time.time() - start))
+
+    def refresh(self):
+        """Re-export the snapshot if it is stale, unless another process is already on it."""
+
+        if self.is_stale():
+            with open("%s.lock" % self.path, 'w') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    logger.info("SLC snapshot is being refreshed by another process, using existing one")
+                else:
+                    # another process may have finished a refresh while we were checking
+                    if self.is_stale(): self.export()
+        self.load()
+
+
+def start_refresher(stopped, interval=600):
+    """
+    Refresh the worker's snapshot whenever it is stale, checking every interval
+    seconds in a daemon thread until the stopped event is set. For long running
+    processes only; a job exiting would kill the export half way.
+    """
+    snapshot = SlcSnapshot()
+
+    def refresh_loop():
+        while not stopped.is_set():
+            try: snapshot.refresh()
+            except Exception as e:
+                logger.warning("Refresh of SLC snapshot failed : %s" % str(e))
+            stopped.wait(interval)
+
+    refresher = threading.Thread(target=refresh_loop, name="slc_snapshot")
+    refresher.daemon = True
+    refresher.start()
+    return refresher
+
+
+_slc_snapshot = None
+
+
+def get_slc_snapshot():
+    """Return the SLC snapshot as last exported, or None if it is disabled, not exported
+       yet or unusable. The snapshot is only an optimization, so errors just fall back to ES."""
+
+    global _slc_snapshot
+    if os.environ.get("SLC_SNAPSHOT_DISABLE"): return None
+    if _slc_snapshot is False: return None
+    try:
+        if _slc_snapshot is None: _slc_snapshot = SlcSnapshot()
+        _slc_snapshot.load()
+    except Exception as e:
+        logger.warning("SLC snapshot unavailable, checking ES directly : %s" % str(e))
+        _slc_snapshot = False
+        return None
+    return _slc_snapshot if _slc_snapshot.view is not None else None
+
+
+if __name__ == "__main__":
+    # out of band refresh, e.g. from cron
+    logging.basicConfig()
+    snapshot = SlcSnapshot()
+    if len(sys.argv) > 1 and sys.argv[1] == "--force":
+        snapshot.max_age = 0
+    snapshot.refresh()
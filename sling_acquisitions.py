@@ -8,11 +8,9 @@ import os, sys, time, json, requests, logging
 import hashlib
 from datetime import datetime
 #from hysds_commons.job_utils import resolve_hysds_job
-from hysds.celery import app
 import util
 import uuid  # only need this import to simulate returned mozart job id
-from hysds.celery import app
-from hysds_commons.job_utils import submit_mozart_job
+from localizer_util import get_conf
 import traceback
 
 
@@ -33,7 +31,6 @@ logger.addFilter(LogFilter())
 IFG_CFG_ID_TMPL = "ifg-cfg_R{}_M{:d}S{:d}_TN{:03d}_{:%Y%m%dT%H%M%S}-{:%Y%m%dT%H%M%S}-{}-{}"
 
 BASE_PATH = os.path.dirname(__file__)
-MOZART_URL = app.conf['MOZART_URL']
 MOZART_ES_ENDPOINT = "MOZART"
 GRQ_ES_ENDPOINT = "GRQ"
 sleep_seconds = 120
@@ -71,10 +68,10 @@ def query_es(endpoint, doc_id):
     """
     es_url, es_index = None, None
     if endpoint == GRQ_ES_ENDPOINT:
-        es_url = app.conf["GRQ_ES_URL"]
+        es_url = get_conf("GRQ_ES_URL")
         es_index = "grq"
     if endpoint == MOZART_ES_ENDPOINT:
-        es_url = app.conf['JOBS_ES_URL']
+        es_url = get_conf('JOBS_ES_URL')
         es_index = "job_status-current"
 
     query = {
@@ -173,7 +170,7 @@ def check_ES_status(doc_id):
     :return: True  if the ES has updated job status within 5 minutes
             otherwise raise a run time error
     """
-    es_url = app.conf['JOBS_ES_URL']
+    es_url = get_conf('JOBS_ES_URL')
     es_index = "job_status-current"
     query = {
         "_source": [
@@ -478,7 +475,7 @@ def submit_sling_job(spyddder_extract_version, acquisition_localizer_version, es
 
     #acquisition_localizer_version = "master"
     #spyddder_extract_version = "develop"
-    job_submit_url = '%s/mozart/api/v0.1/job/submit' % MOZART_URL
+    job_submit_url = '%s/mozart/api/v0.1/job/submit' % get_conf('MOZART_URL')
 
     # set job type and disk space reqs
     job_type = "job-acquisition_localizer_single:{}".format(acquisition_localizer_version)
@@ -559,6 +556,7 @@ def submit_sling_job(spyddder_extract_version, acquisition_localizer_version, es
     logger.info(job_type)
     logger.info(sling_job_name)
 
+    from hysds_commons.job_utils import submit_mozart_job
     mozart_job_id = submit_mozart_job({}, rule,hysdsio={"id": "internal-temporary-wiring", "params": params, "job-specification": job_type}, job_name=sling_job_name)
     logger.info("\nSubmitted sling job with id %s for  %s" %(acq_data["metadata"]["identifier"], mozart_job_id))
 
@@ -574,7 +572,7 @@ def check_ES_status(doc_id):
     :return: True  if the ES has updated job status within 5 minutes
             otherwise raise a run time error
     """
-    es_url = app.conf['JOBS_ES_URL']
+    es_url = get_conf('JOBS_ES_URL')
     es_index = "job_status-current"
     query = {
         "_source": [
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Lease store used to coalesce sling requests for the same SLC across
+concurrently running localizer jobs.
+
+The first localizer to need an SLC claims a lease on it and records the id of
+the sling job it submits; the others find the lease and attach to that job
+instead of submitting their own. Leases expire after SLING_LEASE_TTL, and a
+lease whose job failed can be taken over, so a crashed or failed claimer
+never blocks an SLC for good.
+
+ESLeaseStore keeps leases as docs in the Mozart ES so they are shared by all
+workers. LocalLeaseStore keeps them in a SQLite file in the worker cache
+directory and stands in for it on a single worker or in development.
+
+Lease store errors never fail a localizer job: a lease that cannot be read or
+claimed is treated as absent, so the SLC is just slung without coalescing.
+"""
+import os, json, time, sqlite3, logging, requests
+from contextlib import contextmanager
+import localizer_util
+from acq_cache import get_cache_dir
+
+
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+logger.setLevel(logging.INFO)
+
+
+SLING_LEASE_INDEX = "slc_sling_lease"
+SLING_LEASE_DOC_TYPE = "lease"
+SLING_LEASE_FILE_NAME = "sling_leases.sqlite"
+SLING_LEASE_TTL = int(os.environ.get("SLING_LEASE_TTL", 6 * 3600))
+
+
+def new_lease(slc_id, owner, ttl):
+    now = time.time()
+    return {
+        "slc_id": slc_id,
+        "owner": owner,
+        "job_id": None,
+        "claimed": now,
+        "expires": now + ttl
+    }
+
+
+class ESLeaseStore(object):
+    """Leases stored as ES docs, claimed atomically with op_type=create."""
+
+    def __init__(self, es_url, es_index=SLING_LEASE_INDEX, ttl=SLING_LEASE_TTL):
+        self.rest_url = es_url[:-1] if es_url.endswith('/') else es_url
+        self.es_index = es_index
+        self.ttl = ttl
+
+    def _doc_url(self, slc_id):
+        return "%s/%s/%s/%s" % (self.rest_url, self.es_index, SLING_LEASE_DOC_TYPE, slc_id)
+
+    def get(self, slc_id):
+        """Return tuple(lease, version), or (None, None) if there is no lease."""
+
+        try:
+            r = localizer_util.get_session().get(self._doc_url(slc_id))
+            if r.status_code == 404: return None, None
+            r.raise_for_status()
+            doc = r.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("Failed to get lease on %s : %s" % (slc_id, str(e)))
+            return None, None
+        if not doc.get('found', False): return None, None
+        return doc['_source'], doc['_version']
+
+    def claim(self, slc_id, owner, is_stale=None):
+        """
+        Try to claim the lease on slc_id.
+        :param is_stale: optional function of a lease returning True if it can be
+                         taken over (e.g. because its job failed)
+        :return: tuple(claimed, lease) where lease is ours if claimed, else the holder's
+                 (empty if the lease store failed)
+        """
+        try:
+            return self._claim(slc_id, owner, is_stale)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Failed to claim lease on %s, slinging without it : %s" % (slc_id, str(e)))
+            return False, {}
+
+    def _claim(self, slc_id, owner, is_stale):
+        lease = new_lease(slc_id, owner, self.ttl)
+        r = localizer_util.get_session().put("%s?op_type=create" % self._doc_url(slc_id), data=json.dumps(lease))
+        if r.status_code in (200, 201): return True, lease
+        if r.status_code != 409: r.raise_for_status()
+
+        held, version = self.get(slc_id)
+        if held is None:
+            # released between our create and get, try once more
+            r = localizer_util.get_session().put("%s?op_type=create" % self._doc_url(slc_id), data=json.dumps(lease))
+            if r.status_code in (200, 201): return True, lease
+            return False, self.get(slc_id)[0] or {}
+        if held['expires'] > time.time() and not (is_stale and is_stale(held)):
+            return False, held
+
+        # take over the expired/stale lease unless someone else just did
+        r = localizer_util.get_session().put("%s?version=%s" % (self._doc_url(slc_id), version), data=json.dumps(lease))
+        if r.status_code in (200, 201):
+            logger.info("Took over lease on %s from %s" % (slc_id, held['owner']))
+            return True, lease
+        if r.status_code != 409: r.raise_for_status()
+        return False, self.get(slc_id)[0] or {}
+
+    def set_job(self, slc_id, job_id):
+        """Record the sling job doing the work for the lease on slc_id."""
+
+        try:
+            r = localizer_util.get_session().post("%s/_update" % self._doc_url(slc_id), data=json.dumps({"doc": {"job_id": job_id}}))
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning("Failed to record job %s on lease of %s : %s" % (job_id, slc_id, str(e)))
+
+    def release(self, slc_id):
+        try:
+            r = localizer_util.get_session().delete(self._doc_url(slc_id))
+            if r.status_code not in (200, 404): r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning("Failed to release lease on %s : %s" % (slc_id, str(e)))
+
+
+class LocalLeaseStore(object):
+    """Leases stored in a worker-local SQLite file."""
+
+    def __init__(self, path=None, ttl=SLING_LEASE_TTL):
+        self.path = path or os.path.join(get_cache_dir(), SLING_LEASE_FILE_NAME)
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS sling_lease (
+                              slc_id TEXT PRIMARY KEY,
+                              lease TEXT NOT NULL)""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that holds the database lock from its first read."""
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _get_row(self, slc_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT lease FROM sling_lease WHERE slc_id = ?", (slc_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, slc_id):
+        try:
+            row = self._get_row(slc_id)
+        except sqlite3.Error as e:
+            logger.warning("Failed to get lease on %s : %s" % (slc_id, str(e)))
+            return None, None
+        return (json.loads(row), None) if row else (None, None)
+
+    def claim(self, slc_id, owner, is_stale=None):
+        try:
+            return self._claim(slc_id, owner, is_stale)
+        except sqlite3.Error as e:
+            logger.warning("Failed to claim lease on %s, slinging without it : %s" % (slc_id, str(e)))
+            return False, {}
+
+    def _claim(self, slc_id, owner, is_stale):
+        # is_stale may look up jobs over the network, so it runs before the write lock is taken
+        row = self._get_row(slc_id)
+        if row is not None:
+            held = json.loads(row)
+            if held['expires'] > time.time() and not (is_stale and is_stale(held)):
+                return False, held
+
+        lease = new_lease(slc_id, owner, self.ttl)
+        with self._transaction() as conn:
+            current = conn.execute("SELECT lease FROM sling_lease WHERE slc_id = ?", (slc_id,)).fetchone()
+            if current is not None and current[0] != row:
+                # claimed or updated by someone else since we read it
+                return False, json.loads(current[0])
+            conn.execute("INSERT OR REPLACE INTO sling_lease (slc_id, lease) VALUES (?, ?)",
+                         (slc_id, json.dumps(lease)))
+        if row is not None:
+            logger.info("Took over lease on %s from %s" % (slc_id, json.loads(row)['owner']))
+        return True, lease
+
+    def set_job(self, slc_id, job_id):
+        try:
+            with self._transaction() as conn:
+                row = conn.execute("SELECT lease FROM sling_lease WHERE slc_id = ?", (slc_id,)).fetchone()
+                if row is None: return
+                lease = json.loads(row[0])
+                lease['job_id'] = job_id
+                conn.execute("UPDATE sling_lease SET lease = ? WHERE slc_id = ?", (json.dumps(lease), slc_id))
+        except sqlite3.Error as e:
+            logger.warning("Failed to record job %s on lease of %s : %s" % (job_id, slc_id, str(e)))
+
+    def release(self, slc_id):
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM sling_lease WHERE slc_id = ?", (slc_id,))
+        except sqlite3.Error as e:
+            logger.warning("Failed to release lease on %s : %s" % (slc_id, str(e)))
+
+
+def get_lease_store(store_type, es_url=None):
+    """Return the lease store for store_type ("es" or "local"), or None to disable coalescing."""
+
+    if not store_type: return None
+    if store_type == "es": return ESLeaseStore(es_url)
+    if store_type == "local":
+        try: return LocalLeaseStore()
+        except sqlite3.Error as e:
+            logger.warning("Sling lease store unavailable, slinging without coalescing : %s" % str(e))
+            return None
+    raise RuntimeError("Unknown sling lease store : %s" % store_type)
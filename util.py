@@ -1,12 +1,8 @@
 #!/usr/bin/env python 
 import os, sys, time, json, requests, logging
-from hysds_commons.job_utils import resolve_hysds_job
-from hysds.celery import app
 import datetime
-import dateutil.parser
 from datetime import datetime, timedelta
-
-GRQ_URL = app.conf.GRQ_ES_URL
+from localizer_util import get_grq_url
 
 
 
@@ -16,7 +12,7 @@ def get_dataset(id, index_suffix):
     """Query for existence of dataset by ID."""
 
     # es_url and es_index
-    es_url = GRQ_URL
+    es_url = get_grq_url()
     es_index = "grq_*_{}".format(index_suffix.lower())
     #es_index = "grq"
 
@@ -54,7 +50,7 @@ def get_dataset(id):
     """Query for existence of dataset by ID."""
 
     # es_url and es_index
-    es_url = GRQ_URL
+    es_url = get_grq_url()
     #es_index = "grq_*_{}".format(index_suffix.lower())
     es_index = "grq"
 
@@ -90,7 +86,7 @@ def get_dataset(id):
 
 
 def get_partial_grq_data(id):
-    es_url = GRQ_URL
+    es_url = get_grq_url()
     es_index = "grq"
 
     query = {
@@ -126,7 +122,7 @@ def get_partial_grq_data(id):
 
 
 def get_query_data(query):
-    es_url = GRQ_URL
+    es_url = get_grq_url()
     es_index = "grq"
 
     print(query)
@@ -149,7 +145,7 @@ def get_query_data(query):
 
 
 def get_acquisition_data(id):
-    es_url = GRQ_URL
+    es_url = get_grq_url()
     es_index = "grq_*_*acquisition*"
     query = {
       "query": {